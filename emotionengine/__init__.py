@@ -0,0 +1,3 @@
+from emotionengine.cop2 import COP2Decoder
+
+__all__ = ["COP2Decoder"]
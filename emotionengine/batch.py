@@ -0,0 +1,150 @@
+# Offline batch decoder for ELF/IRX images, runs without IDA:
+#   python -m emotionengine.batch [-j JOBS] [-f json|csv] [-o DIR] FILE...
+#
+# Executable segments are split into chunks and decoded by a process
+# pool; each worker maps the file itself so only paths and offsets are
+# sent between processes. One stats file is written per input.
+
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+
+from emotionengine.cop2 import COP2Decoder
+from emotionengine.stats import COP2Stats
+
+# Bytes of a segment decoded by a single task.
+CHUNK_SIZE = 0x100000
+
+ELF_MAGIC = b"\x7FELF"
+PT_LOAD = 1
+PF_X = 1
+SHF_EXECINSTR = 4
+
+ELF_HEADER = struct.Struct("<16sHHIIIIIHHHHHH")
+ELF_PHDR = struct.Struct("<IIIIIIII")
+ELF_SHDR = struct.Struct("<IIIIIIIIII")
+
+# Returns (file offset, size, vaddr) of the executable parts of a 32-bit
+# little endian ELF, from the program headers or, for relocatable
+# modules without them, the section headers.
+def elf_code_ranges(data):
+
+	if (len(data) < ELF_HEADER.size or data[:4] != ELF_MAGIC or data[4] != 1 or data[5] != 1):
+		raise ValueError("not a 32-bit little endian ELF")
+
+	(ident, e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags,
+		e_ehsize, e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx) = ELF_HEADER.unpack_from(data, 0)
+
+	if (e_phnum and (e_phentsize < ELF_PHDR.size or e_phoff + e_phnum * e_phentsize > len(data))):
+		raise ValueError("program headers out of bounds")
+
+	ranges = []
+	for i in range(e_phnum):
+		p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_flags, p_align = ELF_PHDR.unpack_from(data, e_phoff + i * e_phentsize)
+		if (p_type == PT_LOAD and p_flags & PF_X and p_filesz and p_offset < len(data)):
+			ranges.append((p_offset, min(p_filesz, len(data) - p_offset), p_vaddr))
+
+	if (not ranges):
+		if (e_shnum and (e_shentsize < ELF_SHDR.size or e_shoff + e_shnum * e_shentsize > len(data))):
+			raise ValueError("section headers out of bounds")
+		for i in range(e_shnum):
+			sh = ELF_SHDR.unpack_from(data, e_shoff + i * e_shentsize)
+			sh_flags, sh_addr, sh_offset, sh_size = sh[2], sh[3], sh[4], sh[5]
+			if (sh_flags & SHF_EXECINSTR and sh[1] != 8 and sh_size and sh_offset < len(data)): # 8 SHT_NOBITS
+				ranges.append((sh_offset, min(sh_size, len(data) - sh_offset), sh_addr))
+
+	return ranges
+
+# Splits the code ranges of a file into (path, offset, size, vaddr) tasks.
+def make_tasks(path, chunk_size = CHUNK_SIZE):
+
+	with open(path, "rb") as f:
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			ranges = elf_code_ranges(data)
+
+	tasks = []
+	for offset, size, vaddr in ranges:
+		size &= ~3
+		for start in range(0, size, chunk_size):
+			tasks.append((path, offset + start, min(chunk_size, size - start), vaddr + start))
+
+	return tasks
+
+# Per-worker decoder, built once per process.
+decoder = None
+
+def decode_task(task):
+
+	global decoder
+	if (decoder == None):
+		decoder = COP2Decoder()
+
+	path, offset, size, vaddr = task
+	stats = COP2Stats()
+	stats.words = size // 4
+
+	with open(path, "rb") as f:
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			view = memoryview(data)[offset:offset + size]
+			stats.add_buffer(decoder, view, vaddr)
+			view.release()
+
+	return path, stats
+
+def write_json(path, stats):
+
+	with open(path, "w") as f:
+		json.dump(stats.to_dict(), f, indent=1)
+
+def write_csv(path, stats):
+
+	stats.write_csv(path)
+
+WRITERS = {
+	"json": write_json,
+	"csv": write_csv,
+}
+
+# Decodes every file and writes its stats to out_dir. Returns the stats
+# by path.
+def run(paths, jobs = None, fmt = "json", out_dir = ".", chunk_size = CHUNK_SIZE):
+
+	totals = {}
+	tasks = []
+	for path in paths:
+		try:
+			tasks.extend(make_tasks(path, chunk_size))
+		except (OSError, ValueError) as e:
+			print("%s: skipped (%s)" % (path, e))
+			continue
+		totals[path] = COP2Stats()
+
+	with multiprocessing.Pool(jobs) as pool:
+		for path, stats in pool.imap_unordered(decode_task, tasks):
+			totals[path].merge(stats)
+
+	os.makedirs(out_dir, exist_ok=True)
+	for path, stats in totals.items():
+		out_path = os.path.join(out_dir, os.path.basename(path) + "." + fmt)
+		WRITERS[fmt](out_path, stats)
+		print("%s: %d words, %d COP2, %d BC0, %d CACHE" % (path, stats.words,
+			sum(stats.histogram.values()), sum(stats.bc0.values()), sum(stats.cache_ops.values())))
+
+	return totals
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description="COP2 batch decoder for ELF/IRX images")
+	parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+	parser.add_argument("-f", "--format", choices=sorted(WRITERS), default="json", help="stats file format")
+	parser.add_argument("-o", "--out-dir", default=".", help="directory for the stats files")
+	parser.add_argument("paths", nargs="+", help="ELF or IRX files")
+	args = parser.parse_args(argv)
+
+	run(args.paths, args.jobs, args.format, args.out_dir)
+
+if __name__ == "__main__":
+	main()
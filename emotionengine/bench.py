@@ -0,0 +1,231 @@
+# Decode throughput benchmark, runs without IDA:
+#   python -m emotionengine.bench [-n WORDS] [-r REPEAT] [NAME...]
+
+import argparse
+import array
+import random
+import sys
+import time
+
+from emotionengine import cop2
+from emotionengine.cop2 import COP2Decoder, is_cop2
+from emotionengine.stub import insn_t
+
+VI_CTL_NAMES = {16: "STATUS", 17: "MAC", 18: "CLIP", 20: "R", 21: "I", 22: "Q",
+	26: "TPC", 27: "CMSAR0", 28: "FBRST", 29: "VPU-STAT", 31: "CMSAR1"}
+
+# The rendering the tables replaced: registers formatted per operand, dest
+# masks built by concatenation and a cleared scratch insn. Kept only as
+# the baseline for the render-reference benchmark.
+class ReferenceRenderer:
+
+	def __init__(self, decoder):
+
+		self.decoder = decoder
+		self.scratch = insn_t()
+
+	def decode_dest(self, dword):
+
+		dest = (dword >> 0x15) & 0xF
+
+		s = "."
+		if ((dest >> 3) & 1):
+			s += "x"
+		if ((dest >> 2) & 1):
+			s += "y"
+		if ((dest >> 1) & 1):
+			s += "z"
+		if (dest & 1):
+			s += "w"
+
+		return s
+
+	def get_register(self, op, dword):
+
+		if (op.specval == cop2.VF_REG):
+			return "vf%d" % op.reg
+		elif (op.specval == cop2.VI_REG):
+			if (op.reg < 16):
+				return "vi%d" % op.reg
+			return VI_CTL_NAMES.get(op.reg, "UNK VI")
+		elif (op.specval == cop2.VI_REG_INC):
+			return "(vi%d++)" % op.reg
+		elif (op.specval == cop2.VI_REG_DEC):
+			return "(--vi%d)" % op.reg
+		elif (op.specval == cop2.VF_REG_WITH_F):
+			return "vf%d.%s" % (op.reg & 0xFF, ["x", "y", "z", "w"][op.reg >> 8])
+		elif (op.specval == cop2.VF_REG_WITH_F2):
+			return "vf%d%s" % (op.reg & 0xFF, ["x", "y", "z", "w"][dword & 3])
+		elif (op.specval == cop2.CTL_REG):
+			return "%c" % op.reg
+		elif (op.specval == cop2.CTL_ACC):
+			return "ACC"
+		else:
+			return "UNK"
+
+	def render_instruction(self, dword):
+
+		index, decode, layout = self.decoder.lookup(dword)
+		entry = self.decoder.itable[index]
+
+		dest = ""
+		if (entry.dest):
+			dest = self.decode_dest(dword)
+
+		insn = self.scratch
+		insn.clear()
+		decode(insn, dword)
+
+		operands = []
+		for n in range(len(layout)):
+			op = insn.ops[n]
+			if (op.type == cop2.o_idpspec1):
+				operands.append(self.get_register(op, dword))
+			else:
+				operands.append(None)
+
+		return (entry.name, dest, tuple(operands))
+
+# Synthetic image: mostly valid COP2 macro words with some BC0, CACHE
+# and random (mostly non-COP2) words mixed in.
+class Image:
+
+	def __init__(self, decoder, count, seed = 0, base_ea = 0x100000):
+
+		rnd = random.Random(seed)
+		opcodes = [entry.opcode for entry in decoder.itable]
+		words = array.array('I')
+
+		for i in range(count):
+			kind = rnd.random()
+			if (kind < 0.7):
+				opcode = rnd.choice(opcodes)
+				if (opcode & 0x3C == 0x3C):
+					words.append((0x25 << 25) | (rnd.getrandbits(14) << 11) | opcode)
+				else:
+					words.append((0x25 << 25) | (rnd.getrandbits(19) << 6) | opcode)
+			elif (kind < 0.75):
+				words.append((0x208 << 21) | rnd.getrandbits(18))
+			elif (kind < 0.8):
+				words.append((0x2F << 26) | rnd.getrandbits(26))
+			else:
+				words.append(rnd.getrandbits(32))
+
+		if (sys.byteorder != 'little'):
+			words.byteswap()
+
+		self.base_ea = base_ea
+		self.words = words
+		self.data = words.tobytes()
+		self.cop2_words = [dword for dword in words if is_cop2(dword) and decoder.lookup(dword) != None]
+
+# Each benchmark returns the number of words it processed.
+def bench_decode(decoder, image):
+
+	insn = insn_t()
+	decode = decoder.decode
+	ea = image.base_ea
+	for dword in image.words:
+		insn.clear(ea)
+		decode(insn, dword)
+		ea += 4
+	return len(image.words)
+
+def bench_bulk(decoder, image):
+
+	decoder.decode_buffer(image.data, image.base_ea)
+	return len(image.words)
+
+# One listing line per COP2 word, bypassing the render cache.
+def bench_render(decoder, image):
+
+	render = decoder.render_instruction
+	for dword in image.cop2_words:
+		render(dword)
+	return len(image.cop2_words)
+
+# Same lines through ReferenceRenderer, for the gain of the tables.
+def bench_render_reference(decoder, image):
+
+	render = ReferenceRenderer(decoder).render_instruction
+	for dword in image.cop2_words:
+		render(dword)
+	return len(image.cop2_words)
+
+# Same number of lines, but re-rendering a window that fits the cache
+# like a listing being scrolled back and forth.
+def bench_render_cached(decoder, image):
+
+	render = decoder.render
+	window = image.cop2_words[:0x1000]
+	for i in range(len(image.cop2_words)):
+		render(window[i & 0xFFF])
+	return len(image.cop2_words)
+
+# Full listing line for every COP2 word: decode, mnemonic, operands and
+# optionally the auto comment, like IDA does when painting a line.
+def bench_listing(decoder, image, autocmt = False):
+
+	insn = insn_t()
+	decode = decoder.decode
+	render = decoder.render
+	autocmts = decoder.autocmts
+	for dword in image.cop2_words:
+		decode(insn, dword)
+		name, dest, operands = render(insn.Op1.addr)
+		line = "%s%s %s" % (name, dest, ", ".join(op for op in operands if op != None))
+		if (autocmt):
+			line += " ; " + autocmts[insn.itype]
+	return len(image.cop2_words)
+
+def bench_listing_autocmt(decoder, image):
+
+	return bench_listing(decoder, image, True)
+
+BENCHMARKS = [
+	("decode", bench_decode),
+	("bulk", bench_bulk),
+	("render-reference", bench_render_reference),
+	("render", bench_render),
+	("render-cached", bench_render_cached),
+	("listing", bench_listing),
+	("listing-autocmt", bench_listing_autocmt),
+]
+
+def run(count, repeat, names = None):
+
+	decoder = COP2Decoder()
+	image = Image(decoder, count)
+
+	results = []
+	for name, bench in BENCHMARKS:
+		if (names and name not in names):
+			continue
+		best = None
+		try:
+			for i in range(repeat):
+				start = time.perf_counter()
+				done = bench(decoder, image)
+				elapsed = time.perf_counter() - start
+				if (best == None or elapsed < best):
+					best = elapsed
+		except ImportError as e:
+			print("%-16s skipped (%s)" % (name, e))
+			continue
+		results.append((name, done / best))
+		print("%-16s %12.0f words/s %8.1f ns/word" % (name, done / best, best * 1e9 / done))
+
+	return results
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description="COP2 decoder throughput benchmark")
+	parser.add_argument("-n", "--words", type=int, default=2000000, help="number of synthetic words")
+	parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per benchmark, best is reported")
+	parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+	args = parser.parse_args(argv)
+
+	run(args.words, args.repeat, args.names)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,56 @@
+# Content-hash index of the COP2, BC0 and CACHE words per address chunk.
+# Used to re-analyse only the chunks whose recognised words changed after
+# a byte patch or an overlay load. No IDA dependencies.
+
+import hashlib
+import struct
+import zlib
+
+CHUNK_SIZE = 0x1000
+
+class ChunkIndex:
+
+	def __init__(self, decoder, chunk_size = CHUNK_SIZE):
+
+		self.decoder = decoder
+		self.chunk_size = chunk_size
+
+		# chunk start ea -> (crc32 of the raw bytes, digest of the recognised words)
+		self.chunks = {}
+
+	def hash_words(self, data, base_ea):
+
+		digest = hashlib.blake2b(digest_size=16)
+		for ea, dword in self.decoder.scan_buffer(data, base_ea):
+			digest.update(struct.pack("<II", ea - base_ea, dword))
+		return digest.digest()
+
+	# Re-hashes the chunks of data (loaded at base_ea, 4-byte aligned) and
+	# returns the merged (start_ea, end_ea) ranges whose recognised words
+	# changed. Chunks not seen before count as changed.
+	def update(self, base_ea, data):
+
+		changed = []
+		offset = 0
+		while (offset < len(data)):
+			ea = base_ea + offset
+			end = min(len(data), offset + self.chunk_size - (ea % self.chunk_size))
+			chunk = data[offset:end]
+			key = ea - (ea % self.chunk_size)
+
+			crc = zlib.crc32(chunk)
+			entry = self.chunks.get(key)
+			# Partial chunks at segment edges are keyed by their start, so
+			# an entry covering other bytes never matches by crc alone.
+			if (entry == None or entry[0] != crc or entry[2] != ea):
+				digest = self.hash_words(chunk, ea)
+				self.chunks[key] = (crc, digest, ea)
+				if (entry == None or entry[1] != digest):
+					if (changed and changed[-1][1] == ea):
+						changed[-1] = (changed[-1][0], base_ea + end)
+					else:
+						changed.append((ea, base_ea + end))
+
+			offset = end
+
+		return changed
@@ -0,0 +1,593 @@
+# Headless COP2 decoder core shared by the IDA plugin and offline tools.
+# Nothing in here may import ida_* modules.
+
+import array
+import collections
+import functools
+import sys
+
+from emotionengine.stub import insn_t
+
+# Operand types, same values as ida_ua.o_*.
+o_void = 0
+o_reg = 1
+o_mem = 2
+o_phrase = 3
+o_displ = 4
+o_imm = 5
+o_far = 6
+o_near = 7
+o_idpspec0 = 8
+o_idpspec1 = 9
+
+# Operand specvals.
+VF_REG = 0
+VI_REG = 1
+VI_REG_DEC = 2
+VI_REG_INC = 3
+VF_REG_WITH_F = 4
+VF_REG_WITH_F2 = 5
+CTL_REG = 6
+CTL_ACC = 7
+VCALLMS = 8
+AUTOCMT = 9
+BC0F = 0x100
+BC0T = 0x101
+BC0FL = 0x102
+BC0TL = 0x103
+CACHE = 0x200
+
+# Record layout returned by the bulk decoder. kind is 0 for COP2 macro
+# instructions, 0x100 + bc0 type for BC0 branches and 0x200 for CACHE;
+# index is the itable index (-1 for BC0/CACHE).
+BULK_FIELDS = [
+	('ea',    '<u4'),
+	('kind',  '<u2'),
+	('index', '<i2'),
+	('dword', '<u4'),
+	('ft',    'u1'),
+	('fs',    'u1'),
+	('fd',    'u1'),
+	('dest',  'u1'),
+]
+
+# itype of BC0 and CACHE, which have no itable entry (MIPS_null).
+NULL_ITYPE = 0
+
+# Number of distinct COP2 words whose rendered text is kept around.
+RENDER_CACHE_SIZE = 0x4000
+
+# Rendering tables, indexed by register number, field or opcode.
+FIELD_NAMES = ("x", "y", "z", "w")
+
+VF_NAMES = tuple(sys.intern("vf%d" % reg) for reg in range(32))
+
+VI_NAMES = tuple(sys.intern("vi%d" % reg) for reg in range(16)) + (
+	"STATUS", "MAC", "CLIP", "UNK VI", "R", "I", "Q", "UNK VI",
+	"UNK VI", "UNK VI", "TPC", "CMSAR0", "FBRST", "VPU-STAT", "UNK VI", "CMSAR1",
+)
+
+VI_INC_NAMES = tuple(sys.intern("(vi%d++)" % reg) for reg in range(32))
+VI_DEC_NAMES = tuple(sys.intern("(--vi%d)" % reg) for reg in range(32))
+
+# Indexed by (field << 5) | reg.
+VF_FIELD_NAMES = tuple(sys.intern("vf%d.%s" % (reg, field)) for field in FIELD_NAMES for reg in range(32))
+VF_BC_NAMES = tuple(sys.intern("vf%d%s" % (reg, field)) for field in FIELD_NAMES for reg in range(32))
+
+DEST_SUFFIXES = tuple(sys.intern("." + "".join(FIELD_NAMES[i] for i in range(4) if (dest >> (3 - i)) & 1)) for dest in range(16))
+
+BC0_NAMES = ("bc0f", "bc0t", "bc0fl", "bc0tl")
+
+CACHE_OPS = {
+	0x00: ("ixltg",  "Read tag from specified icache entry to TagLo"),
+	0x01: ("ixldt",  "Read data from specified icache entry to TagLo, and steering bits and BHT to TagHi"),
+	0x02: ("bxlbt",  "Read BTACache entry. FetchAddr to TagLo TargetAddr to TagHi"),
+	0x04: ("ixstg",  "Write tag from TagLo to specified icache entry"),
+	0x05: ("ixsdt",  "Write instruction from TagLo to specified icache entry, also write steering bits from TagHi"),
+	0x06: ("bxsbt",  "Write TagLo to FetchAddr and TagHi to TargetAddr of BTACache entry"),
+	0x07: ("ixin",   "Invalidate specified icache index entry"),
+	0x0A: ("bhinbt", "Partially invalidate BTACache"),
+	0x0B: ("ihin",   "Invalidate specified icache entry"),
+	0x0C: ("bfh",    "Invalidates all BTACache entries"),
+	0x0E: ("ifl",    "Read data from memory into specified icache entry"),
+	0x10: ("dxltg",  "Read specified dcache tag entry to TagLo"),
+	0x11: ("dxldt",  "Read data from specified dcache entry to TagLo"),
+	0x12: ("dxstg",  "Write tag from TagLo to specified dcache entry"),
+	0x13: ("dxsdt",  "Write data from TagLo to specified dcache entry"),
+	0x14: ("dxwbin", "Write specified dcache entry back to memory and invalidate index"),
+	0x16: ("dxin",   "Invalidate specified dcache index entry"),
+	0x18: ("dhwbin", "Write specified dcache entry back to memory and invalidate it"),
+	0x1A: ("dhin",   "Invalidate specified dcache entry"),
+	0x1C: ("dhwoin", "Write dcache entry back to memory, don't invalidate"),
+}
+
+CACHE_FUNCTIONS = tuple(CACHE_OPS.get(op, ("UNKNOWN", "UNKNOWN"))[0] for op in range(32))
+CACHE_COMMENTS = tuple(CACHE_OPS.get(op, ("UNKNOWN", "UNKNOWN"))[1] for op in range(32))
+
+# Instruction record: opcode, mnemonic, operand layout (dt), has dest
+# mask, auto comment. Immutable and shared by every decoder instance.
+idef = collections.namedtuple("idef", ("opcode", "name", "dt", "dest", "cmt"))
+
+INSTRUCTIONS = [
+	# Coprocessor Calculation Instructions
+	idef(0x1FD, "VABS",      1, True,  "Absolute"),
+	idef(0x028, "VADD",      2, True,  "Addition"),
+	idef(0x022, "VADDi",     3, True,  "ADD broadcast I register"),
+	idef(0x020, "VADDq",     4, True,  "ADD broadcast Q register"),
+	idef(0x000, "VADDx",    23, True,  "ADD broadcast bc field"),
+	idef(0x001, "VADDy",    23, True,  "ADD broadcast bc field"),
+	idef(0x002, "VADDz",    23, True,  "ADD broadcast bc field"),
+	idef(0x003, "VADDw",    23, True,  "ADD broadcast bc field"),
+	idef(0x2BC, "VADDA",     5, True,  "ADD output to ACC"),
+	idef(0x23E, "VADDAi",    6, True,  "ADD output to ACC broadcast I register"),
+	idef(0x23C, "VADDAq",    7, True,  "ADD output to ACC broadcast Q register"),
+	idef(0x03C, "VADDAx",    8, True,  "ADD output to ACC broadcast bc field"),
+	idef(0x03D, "VADDAy",    8, True,  "ADD output to ACC broadcast bc field"),
+	idef(0x03E, "VADDAz",    8, True,  "ADD output to ACC broadcast bc field"),
+	idef(0x03F, "VADDAw",    8, True,  "ADD output to ACC broadcast bc field"),
+	idef(0x02C, "VSUB",      2, True,  "Subtraction"),
+	idef(0x026, "VSUBi",     3, True,  "SUB broadcast I register"),
+	idef(0x024, "VSUBq",     4, True,  "SUB broadcast Q register"),
+	idef(0x004, "VSUBx",    23, True,  "SUB broadcast bc field"),
+	idef(0x005, "VSUBy",    23, True,  "SUB broadcast bc field"),
+	idef(0x006, "VSUBz",    23, True,  "SUB broadcast bc field"),
+	idef(0x007, "VSUBw",    23, True,  "SUB broadcast bc field"),
+	idef(0x2FC, "VSUBA",     5, True,  "SUB output to ACC"),
+	idef(0x27E, "VSUBAi",    6, True,  "SUB output to ACC broadcast I register"),
+	idef(0x27C, "VSUBAq",    7, True,  "SUB output to ACC broadcast Q register"),
+	idef(0x07C, "VSUBAx",    8, True,  "SUB output to ACC broadcast bc field"),
+	idef(0x07D, "VSUBAy",    8, True,  "SUB output to ACC broadcast bc field"),
+	idef(0x07E, "VSUBAz",    8, True,  "SUB output to ACC broadcast bc field"),
+	idef(0x07F, "VSUBAw",    8, True,  "SUB output to ACC broadcast bc field"),
+	idef(0x02A, "VMUL",      2, True,  "Multiply"),
+	idef(0x01E, "VMULi",     3, True,  "MUL broadcast I register"),
+	idef(0x01C, "VMULq",     4, True,  "MUL broadcast Q register"),
+	idef(0x018, "VMULx",    23, True,  "MUL broadcast bc field"),
+	idef(0x019, "VMULy",    23, True,  "MUL broadcast bc field"),
+	idef(0x01A, "VMULz",    23, True,  "MUL broadcast bc field"),
+	idef(0x01B, "VMULw",    23, True,  "MUL broadcast bc field"),
+	idef(0x2BE, "VMULA",     5, True,  "MUL output to ACC"),
+	idef(0x1FE, "VMULAi",    6, True,  "MUL output to ACC broadcast I register"),
+	idef(0x1FC, "VMULAq",    7, True,  "MUL output to ACC broadcast Q register"),
+	idef(0x1BC, "VMULAx",    8, True,  "MUL output to ACC broadcast bc field"),
+	idef(0x1BD, "VMULAy",    8, True,  "MUL output to ACC broadcast bc field"),
+	idef(0x1BE, "VMULAz",    8, True,  "MUL output to ACC broadcast bc field"),
+	idef(0x1BF, "VMULAw",    8, True,  "MUL output to ACC broadcast bc field"),
+	idef(0x029, "VMADD",     2, True,  "MUL and ADD"),
+	idef(0x023, "VMADDi",    3, True,  "MUL and ADD broadcast I register"),
+	idef(0x021, "VMADDq",    4, True,  "MUL and ADD broadcast Q register"),
+	idef(0x008, "VMADDx",   23, True,  "MUL and ADD broadcast bc field"),
+	idef(0x009, "VMADDy",   23, True,  "MUL and ADD broadcast bc field"),
+	idef(0x00A, "VMADDz",   23, True,  "MUL and ADD broadcast bc field"),
+	idef(0x00B, "VMADDw",   23, True,  "MUL and ADD broadcast bc field"),
+	idef(0x2BD, "VMADDA",    5, True,  "MUL and ADD output to ACC"),
+	idef(0x23F, "VMADDAi",   6, True,  "MUL and ADD output to ACC broadcast I register"),
+	idef(0x23D, "VMADDAq",   7, True,  "MUL and ADD output to ACC broadcast Q register"),
+	idef(0x0BC, "VMADDAx",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
+	idef(0x0BD, "VMADDAy",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
+	idef(0x0BE, "VMADDAz",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
+	idef(0x0BF, "VMADDAw",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
+	idef(0x02D, "VMSUB",     2, True,  "MUL and SUB"),
+	idef(0x027, "VMSUBi",    3, True,  "MUL and SUB broadcast I register"),
+	idef(0x025, "VMSUBq",    4, True,  "MUL and SUB broadcast Q register"),
+	idef(0x00C, "VMSUBx",   23, True,  "MUL and SUB broadcast bc field"),
+	idef(0x00D, "VMSUBy",   23, True,  "MUL and SUB broadcast bc field"),
+	idef(0x00E, "VMSUBz",   23, True,  "MUL and SUB broadcast bc field"),
+	idef(0x00F, "VMSUBw",   23, True,  "MUL and SUB broadcast bc field"),
+	idef(0x2FD, "VMSUBA",    5, True,  "MUL and SUB output to ACC"),
+	idef(0x27F, "VMSUBAi",   6, True,  "MUL and SUB output to ACC broadcast I register"),
+	idef(0x27D, "VMSUBAq",   7, True,  "MUL and SUB output to ACC broadcast Q register"),
+	idef(0x0FC, "VMSUBAx",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
+	idef(0x0FD, "VMSUBAy",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
+	idef(0x0FE, "VMSUBAz",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
+	idef(0x0FF, "VMSUBAw",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
+	idef(0x02B, "VMAX",      2, True,  "Maximum"),
+	idef(0x01D, "VMAXi",     3, True,  "Maximum broadcast I register"),
+	idef(0x010, "VMAXx",    23, True,  "Maximum broadcast bc field"),
+	idef(0x011, "VMAXy",    23, True,  "Maximum broadcast bc field"),
+	idef(0x012, "VMAXz",    23, True,  "Maximum broadcast bc field"),
+	idef(0x013, "VMAXw",    23, True,  "Maximum broadcast bc field"),
+	idef(0x02F, "VMINI",     2, True,  "Minimum"),
+	idef(0x01F, "VMINIi",    3, True,  "Minimum broadcast I register"),
+	idef(0x014, "VMINIx",   23, True,  "Minimum broadcast bc field"),
+	idef(0x015, "VMINIy",   23, True,  "Minimum broadcast bc field"),
+	idef(0x016, "VMINIz",   23, True,  "Minimum broadcast bc field"),
+	idef(0x017, "VMINIw",   23, True,  "Minimum broadcast bc field"),
+	idef(0x2FE, "VOPMULA",   9, False, "Outer product MULA"),
+	idef(0x02E, "VOPMSUB",  10, False, "Outer product MSUB"),
+	idef(0x2FF, "VNOP",      0, False, "No operation"),
+	idef(0x17C, "VFTOI0",    1, True,  "Float to integer, fixed point 0 bit"),
+	idef(0x17D, "VFTOI4",    1, True,  "Float to integer, fixed point 4 bits"),
+	idef(0x17E, "VFTOI12",   1, True,  "Float to integer, fixed point 12 bits"),
+	idef(0x17F, "VFTOI15",   1, True,  "Float to integer, fixed point 15 bits"),
+	idef(0x13C, "VITOF0",    1, True,  "Integer to float, fixed point 0 bit"),
+	idef(0x13D, "VITOF4",    1, True,  "Integer to float, fixed point 4 bits"),
+	idef(0x13E, "VITOF12",   1, True,  "Integer to float, fixed point 12 bits"),
+	idef(0x13F, "VITOF15",   1, True,  "Integer to float, fixed point 15 bits"),
+	idef(0x1FF, "VCLIP",    11, False, "Clipping"),
+	idef(0x3BC, "VDIV",     12, False, "Floating divide"),
+	idef(0x3BD, "VSQRT",    13, False, "Floating square-root"),
+	idef(0x3BE, "VRSQRT",   12, False, "Floating reciprocal square-root"),
+	idef(0x030, "VIADD",    14, False, "Integer ADD"),
+	idef(0x032, "VIADDI",   15, False, "Integer ADD immediate"),
+	idef(0x034, "VIAND",    14, False, "Integer AND"),
+	idef(0x035, "VIOR",     14, False, "Integer OR"),
+	idef(0x031, "VISUB",    14, False, "Integer SUB"),
+	idef(0x33C, "VMOVE",    16, True,  "Move floating register"),
+	idef(0x3FD, "VMFIR",    17, True,  "Move from integer register"),
+	idef(0x3FC, "VMTIR",    18, False, "Move to integer register"),
+	idef(0x33D, "VMR32",    16, True,  "Rotate right 32 bits"),
+	idef(0x37E, "VLQD",     26, True,  "Load quadword with pre-decrement"),
+	idef(0x37C, "VLQI",     25, True,  "Load quadword with post-increment"),
+	idef(0x37F, "VSQD",     24, True,  "Store quadword with pre-decrement"),
+	idef(0x37D, "VSQI",     19, True,  "Store quadword with post-increment"),
+	idef(0x3FE, "VILWR",    20, True,  "Integer load word register"),
+	idef(0x3FF, "VISWR",    20, True,  "Integer store word register"),
+	idef(0x43E, "VRINIT",   21, False, "Random-unit init R register"),
+	idef(0x43D, "VRGET",    22, True,  "Random-unit get R register"),
+	idef(0x43C, "VRNEXT",   22, True,  "Random-unit next M sequence"),
+	idef(0x43F, "VRXOR",    21, False, "Random-unit XOR R register"),
+	idef(0x3BF, "VWAITQ",    0, False, "Wait Q register"),
+	idef(0x038, "VCALLMS",  27, False, "Start Micro Sub-Routime"),
+	idef(0x039, "VCALLMSR",  0, False, "Start Micro Sub-Routime by Register"),
+]
+
+# Instruction table sorted by opcode, itable index = itype - itype_start.
+ITABLE = tuple(sorted((entry._replace(name = sys.intern(entry.name.lower())) for entry in INSTRUCTIONS), key=lambda x: x.opcode))
+
+# Same table as parallel columns for the hot paths.
+ITABLE_OPCODES = tuple(entry.opcode for entry in ITABLE)
+ITABLE_NAMES = tuple(entry.name for entry in ITABLE)
+ITABLE_DTS = tuple(entry.dt for entry in ITABLE)
+ITABLE_DEST = tuple(entry.dest for entry in ITABLE)
+ITABLE_CMTS = tuple(entry.cmt for entry in ITABLE)
+
+def is_cop2(dword):
+	return dword >> 0x19 == 0x25
+
+def is_bc0(dword):
+	return dword >> 21 == 0x208
+
+def is_cache(dword):
+	return dword >> 26 == 0x2F
+
+# Branch target: signed 16-bit word offset from the delay slot.
+def bc0_target(ea, dword):
+
+	displ = dword & 0xFFFF
+	if (displ > 0x7FFF):
+		displ -= 0x10000
+
+	return ea + 4 + (displ << 2)
+
+# Operand fields as (shift, mask) and field select shifts.
+FT = (0x10, 0x1F)
+FS = (0xB, 0x1F)
+FD = (6, 0x1F)
+IMM5 = (6, 0x1F)
+IMM15 = (6, 0x7FFF)
+FTF = 0x17
+FSF = 0x15
+
+def reg_slot(field, specval, fsel = None):
+	return (o_idpspec1, field, fsel, 0, specval)
+
+def const_slot(name, specval):
+	return (o_idpspec1, None, None, ord(name), specval)
+
+# Operand layouts per dt, one slot per operand:
+# (operand type, field, field select, constant, specval)
+# Decoded operands also keep the raw word in op.addr for rendering.
+LAYOUTS = {
+	0:  ((o_void, None, None, 0, 0),),
+	1:  (reg_slot(FT, VF_REG), reg_slot(FS, VF_REG)),
+	2:  (reg_slot(FD, VF_REG), reg_slot(FS, VF_REG), reg_slot(FT, VF_REG)),
+	3:  (reg_slot(FD, VF_REG), reg_slot(FS, VF_REG), const_slot('I', CTL_REG)),
+	4:  (reg_slot(FD, VF_REG), reg_slot(FS, VF_REG), const_slot('Q', CTL_REG)),
+	5:  (const_slot('A', CTL_ACC), reg_slot(FS, VF_REG), reg_slot(FT, VF_REG)),
+	6:  (const_slot('A', CTL_ACC), reg_slot(FS, VF_REG), const_slot('I', CTL_REG)),
+	7:  (const_slot('A', CTL_ACC), reg_slot(FS, VF_REG), const_slot('Q', CTL_REG)),
+	8:  (const_slot('A', CTL_ACC), reg_slot(FS, VF_REG), reg_slot(FT, VF_REG_WITH_F2)),
+	9:  (const_slot('A', CTL_ACC), reg_slot(FS, VF_REG), reg_slot(FT, VF_REG)),
+	10: (reg_slot(FD, VF_REG), reg_slot(FS, VF_REG), reg_slot(FT, VF_REG)),
+	11: (reg_slot(FS, VF_REG), reg_slot(FT, VF_REG)),
+	12: (const_slot('Q', CTL_REG), reg_slot(FS, VF_REG_WITH_F, FSF), reg_slot(FT, VF_REG_WITH_F, FTF)),
+	13: (const_slot('Q', CTL_REG), reg_slot(FT, VF_REG_WITH_F, FTF)),
+	14: (reg_slot(FD, VI_REG), reg_slot(FS, VI_REG), reg_slot(FT, VI_REG)),
+	15: (reg_slot(FT, VI_REG), reg_slot(FS, VI_REG), (o_imm, IMM5, None, 0, 0)),
+	16: (reg_slot(FT, VF_REG), reg_slot(FS, VF_REG)),
+	17: (reg_slot(FT, VF_REG), reg_slot(FS, VI_REG)),
+	18: (reg_slot(FT, VI_REG), reg_slot(FS, VF_REG_WITH_F, FSF)),
+	19: (reg_slot(FS, VF_REG), reg_slot(FT, VI_REG_INC)),
+	20: (reg_slot(FT, VI_REG), reg_slot(FS, VI_REG)),
+	21: (const_slot('R', CTL_REG), reg_slot(FS, VF_REG_WITH_F, FSF)),
+	22: (reg_slot(FT, VF_REG), const_slot('R', CTL_REG)),
+	23: (reg_slot(FD, VF_REG), reg_slot(FS, VF_REG), reg_slot(FT, VF_REG_WITH_F2)),
+	24: (reg_slot(FS, VF_REG), reg_slot(FT, VI_REG_DEC)),
+	25: (reg_slot(FT, VF_REG), reg_slot(FS, VI_REG_INC)),
+	26: (reg_slot(FT, VF_REG), reg_slot(FS, VI_REG_DEC)),
+	27: ((o_void, IMM15, None, 0, VCALLMS),),
+}
+
+def compile_slot(n, slot):
+
+	optype, field, fsel, const, specval = slot
+
+	if (field == None):
+		def setter(insn, dword):
+			op = insn.ops[n]
+			op.type = optype
+			op.reg = const
+			op.addr = dword
+			op.specval = specval
+		return setter
+
+	shift, mask = field
+
+	if (optype != o_idpspec1):
+		def setter(insn, dword):
+			op = insn.ops[n]
+			op.type = optype
+			op.value = (dword >> shift) & mask
+			op.addr = dword
+			op.specval = specval
+	elif (fsel == None):
+		def setter(insn, dword):
+			op = insn.ops[n]
+			op.type = optype
+			op.reg = (dword >> shift) & mask
+			op.addr = dword
+			op.specval = specval
+	else:
+		def setter(insn, dword):
+			op = insn.ops[n]
+			op.type = optype
+			op.reg = ((dword >> shift) & mask) | (((dword >> fsel) & 3) << 8)
+			op.addr = dword
+			op.specval = specval
+	return setter
+
+def compile_layout(layout):
+
+	setters = tuple(compile_slot(n, slot) for n, slot in enumerate(layout))
+
+	def decode(insn, dword):
+		for setter in setters:
+			setter(insn, dword)
+
+	return decode
+
+# Opcode lookup: 11-bit special opcodes and 6-bit short opcodes map
+# straight to (itable index, compiled decoder, operand layout). Built
+# once at import and shared by every decoder.
+def build_opcode_tables():
+
+	special_table = [None] * 0x800
+	short_table = [None] * 0x40
+	for i in range(len(ITABLE)):
+		opcode = ITABLE_OPCODES[i]
+		layout = LAYOUTS[ITABLE_DTS[i]]
+		decoder = (i, compile_layout(layout), layout)
+		if (opcode & 0x3C == 0x3C):
+			special_table[opcode & 0x7FF] = decoder
+		else:
+			short_table[opcode & 0x3F] = decoder
+
+	return (tuple(special_table), tuple(short_table))
+
+SPECIAL_TABLE, SHORT_TABLE = build_opcode_tables()
+
+# Auto comments indexed directly by itype (insn_t.itype is 16-bit).
+@functools.lru_cache(maxsize=None)
+def get_autocmts(itype_start):
+
+	autocmts = [None] * 0x10000
+	for i in range(len(ITABLE)):
+		autocmts[itype_start + i] = ITABLE_CMTS[i]
+	return tuple(autocmts)
+
+class COP2Decoder:
+
+	def __init__(self, itype_start = 0):
+
+		self.itype_start = itype_start
+		self.itable = ITABLE
+		self.layouts = LAYOUTS
+		self.special_table = SPECIAL_TABLE
+		self.short_table = SHORT_TABLE
+		self.autocmts = get_autocmts(itype_start)
+
+		# ea -> (BC0 specval, target) of every BC0 branch decoded so far.
+		self.bc0_targets = {}
+
+		# NumPy copies of the opcode tables, built on first bulk decode.
+		self.bulk_tables = None
+
+		# Rendered text per raw word, see render_instruction().
+		self.scratch = insn_t()
+		self.render = functools.lru_cache(maxsize=RENDER_CACHE_SIZE)(self.render_instruction)
+
+	def lookup(self, dword):
+
+		if (dword & 0x3C == 0x3C):
+			return self.special_table[dword & 0x7FF]
+		return self.short_table[dword & 0x3F]
+
+	def decode_type_bc0(self, insn, dword):
+
+		insn.itype = NULL_ITYPE
+		insn.Op1.type = o_near
+		insn.Op1.addr = bc0_target(insn.ea, dword)
+		insn.Op1.specval = (dword >> 16) & 3
+		insn.Op1.specval += 0x100
+		insn.size = 4
+		self.bc0_targets[insn.ea] = (insn.Op1.specval, insn.Op1.addr)
+
+	def decode_type_cache(self, insn, dword):
+		insn.itype = NULL_ITYPE
+		insn.Op1.type = o_void
+		insn.Op1.value = (dword >>16) & 0x1F
+		insn.Op1.specval = CACHE
+		insn.Op2.type = o_displ
+		insn.Op2.displ = dword & 0xFFFF # Todo: Is that normal int16 displ or what?
+		insn.Op2.reg = (dword >> 21) & 0x1F
+		insn.size = 4
+
+	def decode_instruction(self, decoder, insn, dword):
+
+		index, decode, layout = decoder
+
+		insn.itype = self.itype_start + index
+		decode(insn, dword)
+		insn.size = 4
+
+	# Decodes dword into insn, returns instruction size or 0.
+	def decode(self, insn, dword):
+
+		if (is_cop2(dword)):
+
+			decoder = self.lookup(dword)
+			if (decoder == None):
+				return 0
+
+			self.decode_instruction(decoder, insn, dword)
+
+		elif (is_bc0(dword)):
+			self.decode_type_bc0(insn, dword)
+		elif (is_cache(dword)):
+			self.decode_type_cache(insn, dword)
+		else:
+			return 0
+		return insn.size
+
+	def get_bulk_tables(self):
+
+		import numpy
+
+		if (self.bulk_tables == None):
+			special = numpy.full(0x800, -1, numpy.int16)
+			short = numpy.full(0x40, -1, numpy.int16)
+			for opcode in range(0x800):
+				if (self.special_table[opcode] != None):
+					special[opcode] = self.special_table[opcode][0]
+			for opcode in range(0x40):
+				if (self.short_table[opcode] != None):
+					short[opcode] = self.short_table[opcode][0]
+			self.bulk_tables = (special, short)
+
+		return self.bulk_tables
+
+	# Vectorized version of decode() over a little-endian buffer.
+	def decode_buffer(self, data, base_ea):
+
+		import numpy
+
+		special, short = self.get_bulk_tables()
+
+		words = numpy.frombuffer(data, dtype='<u4', count=len(data) // 4)
+
+		cop2 = (words >> 25) == 0x25
+		index = numpy.where((words & 0x3C) == 0x3C, special[words & 0x7FF], short[words & 0x3F])
+		cop2 &= index >= 0
+		bc0 = (words >> 21) == 0x208
+		cache = (words >> 26) == 0x2F
+
+		hits = numpy.flatnonzero(cop2 | bc0 | cache)
+		dword = words[hits]
+
+		result = numpy.zeros(len(hits), dtype=BULK_FIELDS)
+		result['ea'] = base_ea + (hits << 2)
+		result['kind'] = numpy.where(bc0[hits], 0x100 + ((dword >> 16) & 3), numpy.where(cache[hits], CACHE, 0))
+		result['index'] = numpy.where(cop2[hits], index[hits], -1)
+		result['dword'] = dword
+		result['ft'] = (dword >> 0x10) & 0x1F
+		result['fs'] = (dword >> 0xB) & 0x1F
+		result['fd'] = (dword >> 6) & 0x1F
+		result['dest'] = (dword >> 0x15) & 0xF
+		return result
+
+	# Pure-Python counterpart of decode_buffer(), yields (ea, dword) for
+	# every COP2, BC0 and CACHE word.
+	def scan_buffer(self, data, base_ea):
+
+		words = array.array('I')
+		words.frombytes(data[:len(data) & ~3])
+		if (sys.byteorder != 'little'):
+			words.byteswap()
+
+		ea = base_ea
+		for dword in words:
+			if (is_cop2(dword)):
+				if (self.lookup(dword) != None):
+					yield (ea, dword)
+			elif (is_bc0(dword) or is_cache(dword)):
+				yield (ea, dword)
+			ea += 4
+
+	# Returns (name, dest suffix, operand strings) for a COP2 macro word.
+	# Operands that are not registers are rendered by IDA and are None.
+	def render_instruction(self, dword):
+
+		index, decode, layout = self.lookup(dword)
+
+		dest = ""
+		if (ITABLE_DEST[index]):
+			dest = self.decode_dest(dword)
+
+		# Every slot of the layout is rewritten, no need to clear insn.
+		insn = self.scratch
+		decode(insn, dword)
+
+		operands = []
+		for n in range(len(layout)):
+			op = insn.ops[n]
+			if (op.type == o_idpspec1):
+				operands.append(self.get_register(op, dword))
+			else:
+				operands.append(None)
+
+		return (ITABLE_NAMES[index], dest, tuple(operands))
+
+	def decode_reg_field(self, val):
+
+		return FIELD_NAMES[val]
+
+	def get_bc0_type(self, bc0_type):
+
+		return BC0_NAMES[bc0_type & 3]
+
+	def get_register(self, op, dword = 0):
+
+		specval = op.specval
+		if (specval == VF_REG):
+			return VF_NAMES[op.reg]
+		elif (specval == VI_REG):
+			if (op.reg < 32):
+				return VI_NAMES[op.reg]
+			return "UNK VI"
+		elif (specval == VI_REG_INC):
+			return VI_INC_NAMES[op.reg]
+		elif (specval == VI_REG_DEC):
+			return VI_DEC_NAMES[op.reg]
+		elif (specval == VF_REG_WITH_F):
+			return VF_FIELD_NAMES[((op.reg >> 3) & 0x60) | (op.reg & 0x1F)]
+		elif (specval == VF_REG_WITH_F2):
+			return VF_BC_NAMES[((dword & 3) << 5) | (op.reg & 0x1F)]
+		elif (specval == CTL_REG):
+			return chr(op.reg)
+		elif (specval == CTL_ACC):
+			return "ACC"
+		else:
+			return "UNK"
+
+	def get_cache_function(self, op):
+
+		return CACHE_FUNCTIONS[op.value & 0x1F]
+
+	def decode_dest(self, dword):
+
+		return DEST_SUFFIXES[(dword >> 0x15) & 0xF]
+
+	def get_cache_comment(self, op):
+
+		return CACHE_COMMENTS[op.value & 0x1F]
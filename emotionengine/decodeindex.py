@@ -0,0 +1,131 @@
+# Persistent decode index: a sidecar file with one fixed-size record per
+# COP2, BC0 and CACHE word, read back through mmap without copying.
+# No IDA dependencies.
+#
+# File layout: header (magic, format version, itable stamp, record count)
+# followed by records sorted by ea, same layout as the first four
+# BULK_FIELDS (ea, kind, itable index, raw word with the operand fields).
+
+import hashlib
+import mmap
+import os
+import struct
+
+from emotionengine import cop2
+
+INDEX_MAGIC = b"EECOP2IX"
+INDEX_VERSION = 1
+
+INDEX_FIELDS = cop2.BULK_FIELDS[:4]
+
+HEADER = struct.Struct("<8sI8sI")
+RECORD = struct.Struct("<IHhI")
+
+# Changes whenever the opcode table does, which invalidates old files.
+TABLE_STAMP = hashlib.blake2b(repr(cop2.ITABLE).encode(), digest_size=8).digest()
+
+# Packed index records for the words in data, loaded at base_ea. keep, if
+# given, filters words by ea.
+def pack_records(decoder, data, base_ea, keep = None):
+
+	try:
+		result = decoder.decode_buffer(data, base_ea)
+	except ImportError:
+		records = []
+		for ea, dword in decoder.scan_buffer(data, base_ea):
+			if (keep != None and not keep(ea)):
+				continue
+			if (cop2.is_bc0(dword)):
+				records.append(RECORD.pack(ea, 0x100 + ((dword >> 16) & 3), -1, dword))
+			elif (cop2.is_cache(dword)):
+				records.append(RECORD.pack(ea, cop2.CACHE, -1, dword))
+			else:
+				records.append(RECORD.pack(ea, 0, decoder.lookup(dword)[0], dword))
+		return b"".join(records)
+
+	if (keep != None):
+		import numpy
+
+		result = result[numpy.array([keep(ea) for ea in result['ea'].tolist()], dtype=bool)]
+	return result[[name for name, dtype in INDEX_FIELDS]].astype(INDEX_FIELDS).tobytes()
+
+# Writes packed record blocks, in ea order, to path. The file is replaced
+# atomically so readers never see a partial index.
+def write_index(path, blocks):
+
+	count = 0
+	tmp_path = path + ".tmp"
+	with open(tmp_path, "wb") as f:
+		f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, TABLE_STAMP, 0))
+		for block in blocks:
+			f.write(block)
+			count += len(block) // RECORD.size
+		f.seek(0)
+		f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, TABLE_STAMP, count))
+	os.replace(tmp_path, path)
+
+	return count
+
+class DecodeIndex:
+
+	def __init__(self, path):
+
+		with open(path, "rb") as f:
+			self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		self.count = 0
+		self.valid = False
+		if (len(self.map) >= HEADER.size):
+			magic, version, stamp, count = HEADER.unpack_from(self.map, 0)
+			if (magic == INDEX_MAGIC and version == INDEX_VERSION and stamp == TABLE_STAMP
+				and len(self.map) == HEADER.size + count * RECORD.size):
+				self.count = count
+				self.valid = True
+
+	def close(self):
+		self.map.close()
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, i):
+		return RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size)
+
+	def __iter__(self):
+		return RECORD.iter_unpack(memoryview(self.map)[HEADER.size:])
+
+	# Zero-copy NumPy view with INDEX_FIELDS.
+	def array(self):
+
+		import numpy
+
+		return numpy.frombuffer(self.map, dtype=INDEX_FIELDS, count=self.count, offset=HEADER.size)
+
+	# Record at ea, or None.
+	def get(self, ea):
+
+		lo = 0
+		hi = self.count
+		while (lo < hi):
+			mid = (lo + hi) // 2
+			if (self[mid][0] < ea):
+				lo = mid + 1
+			else:
+				hi = mid
+		if (lo < self.count and self[lo][0] == ea):
+			return self[lo]
+		return None
+
+# Opens the index at path. Returns None if it is missing or was written
+# for another format version or opcode table.
+def load_index(path):
+
+	if (not os.path.exists(path) or os.path.getsize(path) < HEADER.size):
+		return None
+
+	index = DecodeIndex(path)
+	if (not index.valid):
+		index.close()
+		return None
+
+	return index
@@ -0,0 +1,130 @@
+# VU0 register def-use index for one function, at vf/ACC field
+# granularity. No IDA dependencies.
+#
+# Register reads and writes come from the same per-layout effects as the
+# stall estimator. Definitions reach in address order (flow-insensitive
+# across branches), which matches how the listing is read.
+
+import struct
+
+from emotionengine import cop2
+from emotionengine.pipeline import StallEstimator, ACC, Q, R, VI
+
+def resource_name(res):
+
+	if (res < ACC):
+		return "vf%d.%s" % (res >> 2, cop2.FIELD_NAMES[res & 3])
+	elif (res < Q):
+		return "ACC.%s" % cop2.FIELD_NAMES[res - ACC]
+	elif (res == Q):
+		return "Q"
+	elif (res == R):
+		return "R"
+	return "vi%d" % (res - VI)
+
+# Resources for a register name: "vf3" (all fields), "vf3.xz", "ACC.w",
+# "vi2", "Q" or "R". Unknown names give an empty tuple.
+def parse_register(name):
+
+	name = name.strip()
+	reg, dot, fields = name.partition(".")
+	if (not dot):
+		fields = "xyzw"
+	if (any(f not in cop2.FIELD_NAMES for f in fields)):
+		return ()
+	fields = tuple(cop2.FIELD_NAMES.index(f) for f in fields)
+
+	if (reg == "ACC"):
+		return tuple(ACC + f for f in fields)
+	elif (reg == "Q" and not dot):
+		return (Q,)
+	elif (reg == "R" and not dot):
+		return (R,)
+	elif (reg[:2] == "vf" and reg[2:].isdigit() and int(reg[2:]) < 32):
+		return tuple((int(reg[2:]) << 2) | f for f in fields)
+	elif (reg[:2] == "vi" and reg[2:].isdigit() and int(reg[2:]) < 16 and not dot):
+		return (VI + int(reg[2:]),)
+	return ()
+
+class DefUseIndex:
+
+	# words is the function's (ea, dword) sequence in address order.
+	def __init__(self, estimator, words):
+
+		# res -> [ea] of every definition and use.
+		self.defs = {}
+		self.uses = {}
+		# ea -> {res: defining ea} for every resource the instruction reads.
+		self.reaching = {}
+		# ea -> {res: [using ea]} for every resource the instruction writes.
+		self.def_uses = {}
+
+		last_def = {}
+		for ea, dword in words:
+			reads, writes, latency = estimator.get_effects(dword)
+			if (reads):
+				reaching = {}
+				# fs and ft may name the same register.
+				for res in dict.fromkeys(reads):
+					self.uses.setdefault(res, []).append(ea)
+					if (res in last_def):
+						reaching[res] = last_def[res]
+						self.def_uses[last_def[res]][res].append(ea)
+				self.reaching[ea] = reaching
+			if (writes):
+				uses = self.def_uses.setdefault(ea, {})
+				for res in writes:
+					self.defs.setdefault(res, []).append(ea)
+					last_def[res] = ea
+					uses[res] = []
+
+	def defs_of(self, res):
+		return self.defs.get(res, [])
+
+	def uses_of(self, res):
+		return self.uses.get(res, [])
+
+	# Definition of res read at ea, or None.
+	def reaching_def(self, ea, res):
+		return self.reaching.get(ea, {}).get(res)
+
+	# Instructions reading the value of res written at ea.
+	def uses_of_def(self, ea, res):
+		return self.def_uses.get(ea, {}).get(res, [])
+
+# Def-use indexes per function. The owner drops entries when bytes or
+# function bounds change, so a lookup never reads the function again.
+class DefUseCache:
+
+	def __init__(self, decoder):
+
+		self.estimator = StallEstimator(decoder)
+		# function start -> (function end, DefUseIndex)
+		self.functions = {}
+
+	# Cached index of the function start_ea..end_ea, or None.
+	def lookup(self, start_ea, end_ea):
+
+		entry = self.functions.get(start_ea)
+		if (entry != None and entry[0] == end_ea):
+			return entry[1]
+		return None
+
+	# Builds the index of a function from its bytes, loaded at start_ea.
+	def build(self, start_ea, data):
+
+		words = [(start_ea + (i << 2), dword) for i, (dword,) in enumerate(struct.iter_unpack("<I", data[:len(data) & ~3]))]
+		index = DefUseIndex(self.estimator, words)
+		self.functions[start_ea] = (start_ea + len(data), index)
+		return index
+
+	# Drops the functions overlapping start_ea..end_ea.
+	def invalidate(self, start_ea, end_ea):
+
+		for func_start in [ea for ea, (func_end, index) in self.functions.items() if ea < end_ea and func_end > start_ea]:
+			del self.functions[func_start]
+
+	def clear(self):
+
+		self.functions.clear()
+
@@ -0,0 +1,160 @@
+# Streaming assembler export of COP2 code, runs without IDA:
+#   python -m emotionengine.export [-o OUT] [--addresses] FILE
+#
+# Words are read in fixed-size blocks and turned into GNU as / ee-gcc
+# syntax lines by a generator, then written in large batches, so memory
+# use does not grow with the input. COP2 macro, BC0 and CACHE words are
+# disassembled; everything else is emitted as .word.
+
+import argparse
+import functools
+import mmap
+import struct
+import sys
+
+from emotionengine import cop2
+from emotionengine.batch import elf_code_ranges
+from emotionengine.stub import insn_t
+
+# Bytes decoded per block and lines per write.
+BLOCK_SIZE = 0x100000
+WRITE_LINES = 0x4000
+
+# Distinct COP2 words whose line text is kept around.
+FORMAT_CACHE_SIZE = 0x10000
+
+HEADER = "\t.set\tnoreorder\n\t.set\tnoat\n"
+
+# ee-gcc writes field-selected registers without the dot (vf1x).
+AS_NAMES = dict(zip(cop2.VF_FIELD_NAMES, cop2.VF_BC_NAMES))
+
+VI_SPECVALS = (cop2.VI_REG, cop2.VI_REG_DEC, cop2.VI_REG_INC)
+
+class Exporter:
+
+	def __init__(self, decoder, addresses = False):
+
+		self.decoder = decoder
+		self.addresses = addresses
+		self.format_cop2 = functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)(self.format_instruction)
+		self.insn = insn_t()
+
+	# ee-gcc only knows vi0-vi15; higher vi fields render as control
+	# register names or UNK VI and would not assemble.
+	def has_bad_operand(self, dword):
+
+		index, decode, layout = self.decoder.lookup(dword)
+		decode(self.insn, dword)
+		for n in range(len(layout)):
+			op = self.insn.ops[n]
+			if (op.type == cop2.o_idpspec1 and op.specval in VI_SPECVALS and op.reg > 15):
+				return True
+		return False
+
+	def format_instruction(self, dword):
+
+		index = self.decoder.lookup(dword)[0]
+		name, dest, operands = self.decoder.render(dword)
+		dt = cop2.ITABLE_DTS[index]
+
+		# gas has no syntax for an empty dest mask ("vadd.").
+		if (cop2.ITABLE_DEST[index] and (dword >> 21) & 0xF == 0):
+			return ".word\t0x%08X" % dword
+		if ("UNK" in operands or self.has_bad_operand(dword)):
+			return ".word\t0x%08X" % dword
+
+		args = []
+		for operand in operands:
+			if (operand != None):
+				args.append(AS_NAMES.get(operand, operand))
+			elif (dt == 15):
+				imm = (dword >> 6) & 0x1F
+				args.append("%d" % (imm - 0x20 if imm & 0x10 else imm))
+			elif (dt == 27):
+				args.append("0x%X" % (((dword >> 6) & 0x7FFF) << 3))
+
+		if (args):
+			return "%s%s\t%s" % (name, dest, ", ".join(args))
+		return name + dest
+
+	def format_word(self, ea, dword):
+
+		if (cop2.is_cop2(dword)):
+			if (self.decoder.lookup(dword) != None):
+				return self.format_cop2(dword)
+		elif (cop2.is_bc0(dword)):
+			return "%s\t.%+d" % (cop2.BC0_NAMES[(dword >> 16) & 3], cop2.bc0_target(ea, dword) - ea)
+		elif (cop2.is_cache(dword)):
+			offset = dword & 0xFFFF
+			if (offset & 0x8000):
+				offset -= 0x10000
+			return "cache\t0x%X, %d($%d)" % ((dword >> 16) & 0x1F, offset, (dword >> 21) & 0x1F)
+		return ".word\t0x%08X" % dword
+
+	# Yields one line per word of data, loaded at base_ea.
+	def lines(self, data, base_ea):
+
+		view = memoryview(data)
+		size = len(view) & ~3
+		for start in range(0, size, BLOCK_SIZE):
+			block = view[start:min(size, start + BLOCK_SIZE)]
+			ea = base_ea + start
+			if (self.addresses):
+				for (dword,) in struct.iter_unpack("<I", block):
+					yield "\t%s\t# %08X\n" % (self.format_word(ea, dword), ea)
+					ea += 4
+			else:
+				for (dword,) in struct.iter_unpack("<I", block):
+					yield "\t%s\n" % self.format_word(ea, dword)
+					ea += 4
+			block.release()
+		view.release()
+
+# Writes lines to f in batches. Returns the number of lines.
+def write_lines(f, lines):
+
+	count = 0
+	batch = []
+	for line in lines:
+		batch.append(line)
+		if (len(batch) == WRITE_LINES):
+			f.write("".join(batch))
+			count += len(batch)
+			batch = []
+	f.write("".join(batch))
+
+	return count + len(batch)
+
+# Exports the code ranges of an ELF file to f. Returns the number of lines.
+def export_elf(path, f, decoder, addresses = False):
+
+	exporter = Exporter(decoder, addresses)
+	count = 0
+	f.write(HEADER)
+	with open(path, "rb") as elf:
+		with mmap.mmap(elf.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			for offset, size, vaddr in elf_code_ranges(data):
+				f.write("\n\t# 0x%08X\n\t.text\n" % vaddr)
+				view = memoryview(data)[offset:offset + size]
+				count += write_lines(f, exporter.lines(view, vaddr))
+				view.release()
+
+	return count
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description="Export COP2 code as GNU as / ee-gcc assembly")
+	parser.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+	parser.add_argument("--addresses", action="store_true", help="add the address of each word as a comment")
+	parser.add_argument("path", help="ELF or IRX file")
+	args = parser.parse_args(argv)
+
+	decoder = cop2.COP2Decoder()
+	if (args.output == None):
+		export_elf(args.path, sys.stdout, decoder, args.addresses)
+	else:
+		with open(args.output, "w", buffering=1 << 20) as f:
+			export_elf(args.path, f, decoder, args.addresses)
+
+if __name__ == "__main__":
+	main()
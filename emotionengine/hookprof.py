@@ -0,0 +1,63 @@
+# Call counters and timers for processor hooks. No IDA dependencies.
+#
+# Hooks are wrapped only while profiling is on; with it off the original
+# methods are called directly and nothing here runs.
+
+import collections
+import csv
+import time
+
+class HookProfiler:
+
+	def __init__(self):
+
+		# hook name -> [calls, hits, nanoseconds]
+		self.hooks = collections.OrderedDict()
+		# opcode name -> decoded count
+		self.opcodes = collections.Counter()
+
+	# Returns fn wrapped to count calls, hits (a non-zero result) and time.
+	# classify(args, result) names the opcode of a hit, or returns None.
+	def wrap(self, name, fn, classify = None):
+
+		stats = self.hooks.setdefault(name, [0, 0, 0])
+		opcodes = self.opcodes
+		clock = time.perf_counter_ns
+
+		def wrapper(*args):
+			start = clock()
+			result = fn(*args)
+			stats[2] += clock() - start
+			stats[0] += 1
+			if (result):
+				stats[1] += 1
+				if (classify != None):
+					opcode = classify(args, result)
+					if (opcode != None):
+						opcodes[opcode] += 1
+			return result
+
+		return wrapper
+
+	def report(self, top = 20):
+
+		lines = ["%-22s %12s %7s %12s %10s" % ("hook", "calls", "hits", "total ms", "ns/call")]
+		for name, (calls, hits, ns) in self.hooks.items():
+			if (calls):
+				lines.append("%-22s %12d %6.1f%% %12.3f %10.0f" % (name, calls, hits * 100.0 / calls, ns / 1e6, ns / calls))
+		if (self.opcodes):
+			lines.append("")
+			lines.append("%-22s %12s" % ("opcode", "decoded"))
+			for opcode, count in self.opcodes.most_common(top):
+				lines.append("%-22s %12d" % (opcode, count))
+		return lines
+
+	def write_csv(self, path):
+
+		with open(path, "w", newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(("section", "name", "calls", "hits", "ns"))
+			for name, (calls, hits, ns) in self.hooks.items():
+				writer.writerow(("hook", name, calls, hits, ns))
+			for opcode, count in self.opcodes.most_common():
+				writer.writerow(("opcode", opcode, count, count, ""))
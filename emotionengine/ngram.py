@@ -0,0 +1,167 @@
+# Opcode pattern search over decoded COP2 macro instructions. No IDA
+# dependencies.
+#
+# Instructions are kept as one sequence in address order; a gap of more
+# than max_gap bytes between two COP2 instructions breaks it. Trigrams of
+# itable indexes (and single indexes for short patterns) map to their
+# positions, so a query only verifies the positions of its rarest n-gram.
+#
+# Pattern syntax, instructions separated by ";":
+#   vmulax.xyzw ACC, $v, vf*x; vmadday ACC, $w, *; vmaddw
+# The mnemonic is exact, or "*" for any instruction. The dest suffix and
+# operands are optional and only checked when given. An operand is "*",
+# a shell-style glob on the rendered text ("vf*x"), or a $variable that
+# must name the same register (field suffix ignored) everywhere it is used.
+
+import fnmatch
+
+from emotionengine import cop2
+
+# Largest distance in bytes between two instructions of one sequence.
+MAX_GAP = 16
+
+# Separator between sequences.
+BREAK = -1
+
+NAME_INDEXES = {name: i for i, name in enumerate(cop2.ITABLE_NAMES)}
+
+def trigram_key(a, b, c):
+	return (a << 16) | (b << 8) | c
+
+# Register of a rendered operand without its field: vf3x, vf3.x -> vf3.
+def operand_register(text):
+
+	if (text[:2] == "vf"):
+		end = 2
+		while (end < len(text) and text[end].isdigit()):
+			end += 1
+		return text[:end]
+	return text
+
+# Parsed instruction pattern: (itable index or None, dest or None, operands or None).
+def parse_pattern(text):
+
+	pattern = []
+	for part in text.split(";"):
+		part = part.strip()
+		if (not part):
+			continue
+		mnem, space, rest = part.partition(" ")
+		name, dot, dest = mnem.partition(".")
+		name = name.lower()
+
+		index = None
+		if (name != "*"):
+			if (name not in NAME_INDEXES):
+				raise ValueError("unknown instruction: %s" % name)
+			index = NAME_INDEXES[name]
+
+		operands = None
+		if (rest.strip()):
+			operands = tuple(op.strip() for op in rest.split(","))
+
+		pattern.append((index, dot + dest if dot else None, operands))
+
+	if (not pattern):
+		raise ValueError("empty pattern")
+	return pattern
+
+class NgramIndex:
+
+	# records: (ea, itable index, dword) of COP2 macro instructions, sorted by ea.
+	def __init__(self, decoder, records, max_gap = MAX_GAP):
+
+		self.decoder = decoder
+		self.eas = []
+		self.indexes = []
+		self.dwords = []
+
+		last_ea = None
+		for ea, index, dword in records:
+			if (last_ea != None and ea - last_ea > max_gap):
+				self.eas.append(None)
+				self.indexes.append(BREAK)
+				self.dwords.append(0)
+			self.eas.append(ea)
+			self.indexes.append(index)
+			self.dwords.append(dword)
+			last_ea = ea
+
+		self.unigrams = {}
+		self.trigrams = {}
+		indexes = self.indexes
+		for pos in range(len(indexes)):
+			if (indexes[pos] == BREAK):
+				continue
+			self.unigrams.setdefault(indexes[pos], []).append(pos)
+			if (pos + 2 < len(indexes) and indexes[pos + 1] != BREAK and indexes[pos + 2] != BREAK):
+				self.trigrams.setdefault(trigram_key(indexes[pos], indexes[pos + 1], indexes[pos + 2]), []).append(pos)
+
+	def __len__(self):
+		return len(self.eas) - self.indexes.count(BREAK)
+
+	# Start positions that may match, from the rarest n-gram of the pattern.
+	def candidates(self, pattern):
+
+		best = None
+		for offset in range(len(pattern)):
+			window = [entry[0] for entry in pattern[offset:offset + 3]]
+			if (len(window) == 3 and None not in window):
+				positions = self.trigrams.get(trigram_key(*window), [])
+			elif (window[0] != None):
+				positions = self.unigrams.get(window[0], [])
+			else:
+				continue
+			if (best == None or len(positions) < len(best[1])):
+				best = (offset, positions)
+
+		if (best == None):
+			return range(len(self.indexes) - len(pattern) + 1)
+
+		offset, positions = best
+		return [pos - offset for pos in positions if pos >= offset]
+
+	def match_at(self, pos, pattern):
+
+		if (pos + len(pattern) > len(self.indexes)):
+			return False
+
+		variables = {}
+		for i, (index, dest, operands) in enumerate(pattern):
+			actual = self.indexes[pos + i]
+			if (actual == BREAK or (index != None and actual != index)):
+				return False
+			if (dest == None and operands == None):
+				continue
+
+			name, actual_dest, actual_operands = self.decoder.render(self.dwords[pos + i])
+			if (dest != None and dest != actual_dest):
+				return False
+			if (operands == None):
+				continue
+
+			actual_operands = [op for op in actual_operands if op != None]
+			if (len(operands) > len(actual_operands)):
+				return False
+			for want, have in zip(operands, actual_operands):
+				if (want[:1] == "$"):
+					reg = operand_register(have)
+					if (variables.setdefault(want, reg) != reg):
+						return False
+				elif (not fnmatch.fnmatchcase(have, want)):
+					return False
+
+		return True
+
+	# Returns the ea lists of every match of a pattern (text or parsed).
+	def query(self, pattern):
+
+		if (isinstance(pattern, str)):
+			pattern = parse_pattern(pattern)
+
+		matches = []
+		for pos in self.candidates(pattern):
+			if (self.match_at(pos, pattern)):
+				matches.append(self.eas[pos:pos + len(pattern)])
+
+		return matches
@@ -0,0 +1,209 @@
+# Rough COP2 macro mode stall estimator for straight-line code and loops.
+# No IDA dependencies.
+#
+# Instructions issue in order, one per cycle, and wait until every
+# register field they read has been written back. Every vf result,
+# including moves, loads and LQC2/QMTC2 from the EE side, goes through the
+# 4 cycle FMAC pipeline. ACC is only read by MADD/MSUB/OPMSUB, which get
+# it forwarded, so a chain of accumulating ops issues back to back.
+# DIV/SQRT take 7 and RSQRT 13 cycles to reach Q; VWAITQ, Q operands and
+# a new FDIV op wait for Q. vi and R results are ready the next cycle.
+# This is an estimate to find bubbles, not a cycle-accurate model.
+
+from emotionengine import cop2
+
+FMAC_LATENCY = 4
+DIV_LATENCY = 7
+RSQRT_LATENCY = 13
+
+# Resources tracked: vf1-vf31 per field, ACC per field, Q, R, vi1-vi15.
+# vf0 and vi0 are constant and never wait.
+ACC = 128
+Q = 132
+R = 133
+VI = 136
+
+DEST_FIELDS = tuple(tuple(i for i in range(4) if (dest >> (3 - i)) & 1) for dest in range(16))
+XYZ = (0, 1, 2)
+
+def vf(reg, fields):
+	if (reg == 0):
+		return ()
+	return tuple((reg << 2) | field for field in fields)
+
+def vi(reg):
+	if (reg == 0 or reg > 15):
+		return ()
+	return (VI + reg,)
+
+def acc(fields):
+	return tuple(ACC + field for field in fields)
+
+# (reads, writes) per operand layout, from the raw word and dest fields.
+def layout_effects(dt, dword, d):
+
+	ft = (dword >> 16) & 0x1F
+	fs = (dword >> 11) & 0x1F
+	fd = (dword >> 6) & 0x1F
+
+	if (dt == 1 or dt == 16):
+		return (vf(fs, d), vf(ft, d))
+	elif (dt == 2):
+		return (vf(fs, d) + vf(ft, d), vf(fd, d))
+	elif (dt == 3):
+		return (vf(fs, d), vf(fd, d))
+	elif (dt == 4):
+		return (vf(fs, d) + (Q,), vf(fd, d))
+	elif (dt == 5):
+		return (vf(fs, d) + vf(ft, d), acc(d))
+	elif (dt == 6):
+		return (vf(fs, d), acc(d))
+	elif (dt == 7):
+		return (vf(fs, d) + (Q,), acc(d))
+	elif (dt == 8):
+		return (vf(fs, d) + vf(ft, (dword & 3,)), acc(d))
+	elif (dt == 9):
+		return (vf(fs, XYZ) + vf(ft, XYZ), acc(XYZ))
+	elif (dt == 10):
+		return (vf(fs, XYZ) + vf(ft, XYZ) + acc(XYZ), vf(fd, XYZ))
+	elif (dt == 11):
+		return (vf(fs, XYZ) + vf(ft, (3,)), ())
+	elif (dt == 12):
+		return (vf(fs, ((dword >> 21) & 3,)) + vf(ft, ((dword >> 23) & 3,)) + (Q,), (Q,))
+	elif (dt == 13):
+		return (vf(ft, ((dword >> 23) & 3,)) + (Q,), (Q,))
+	elif (dt == 14):
+		return (vi(fs) + vi(ft), vi(fd))
+	elif (dt == 15):
+		return (vi(fs), vi(ft))
+	elif (dt == 17):
+		return (vi(fs), vf(ft, d))
+	elif (dt == 18):
+		return (vf(fs, ((dword >> 21) & 3,)), vi(ft))
+	elif (dt == 19 or dt == 24):
+		return (vf(fs, d) + vi(ft), vi(ft))
+	elif (dt == 20):
+		return (vi(fs), vi(ft))
+	elif (dt == 21):
+		return (vf(fs, ((dword >> 21) & 3,)), (R,))
+	elif (dt == 22):
+		return ((R,), vf(ft, d))
+	elif (dt == 23):
+		return (vf(fs, d) + vf(ft, (dword & 3,)), vf(fd, d))
+	elif (dt == 25 or dt == 26):
+		return (vi(fs), vf(ft, d) + vi(fs))
+	return ((), ())
+
+# Per itable index: effects function and result latency.
+def make_effects(index):
+
+	name = cop2.ITABLE_NAMES[index]
+	dt = cop2.ITABLE_DTS[index]
+
+	# Applies to vf and Q results, see result_latency().
+	latency = FMAC_LATENCY
+	if (name in ("vdiv", "vsqrt")):
+		latency = DIV_LATENCY
+	elif (name == "vrsqrt"):
+		latency = RSQRT_LATENCY
+
+	if (name == "vwaitq"):
+		def effects(dword):
+			return ((Q,), ())
+	elif (name == "vmr32"):
+		def effects(dword):
+			d = DEST_FIELDS[(dword >> 21) & 0xF]
+			return (vf((dword >> 11) & 0x1F, tuple((f + 1) & 3 for f in d)), vf((dword >> 16) & 0x1F, d))
+	elif (name == "viswr"):
+		def effects(dword):
+			return (vi((dword >> 11) & 0x1F) + vi((dword >> 16) & 0x1F), ())
+	elif (name.startswith("vmadd") or name.startswith("vmsub")):
+		def effects(dword):
+			d = DEST_FIELDS[(dword >> 21) & 0xF]
+			reads, writes = layout_effects(dt, dword, d)
+			return (reads + acc(d), writes)
+	else:
+		def effects(dword):
+			return layout_effects(dt, dword, DEST_FIELDS[(dword >> 21) & 0xF])
+
+	return (effects, latency)
+
+EFFECTS = tuple(make_effects(i) for i in range(len(cop2.ITABLE)))
+
+ALL_FIELDS = (0, 1, 2, 3)
+
+# Latency of a written resource, given the latency of the instruction.
+def result_latency(res, latency):
+
+	if (res < ACC or res == Q):
+		return latency
+	return 1
+
+# EE side instructions that move whole vf registers: LQC2, SQC2, QMFC2, QMTC2.
+def ee_effects(dword):
+
+	op = dword >> 26
+	if (op == 0x36):
+		return ((), vf((dword >> 16) & 0x1F, ALL_FIELDS))
+	elif (op == 0x3E):
+		return (vf((dword >> 16) & 0x1F, ALL_FIELDS), ())
+	elif (dword >> 21 == 0x241):
+		return (vf((dword >> 11) & 0x1F, ALL_FIELDS), ())
+	elif (dword >> 21 == 0x245):
+		return ((), vf((dword >> 11) & 0x1F, ALL_FIELDS))
+	return ((), ())
+
+class StallEstimator:
+
+	def __init__(self, decoder):
+
+		self.decoder = decoder
+		self.effects = EFFECTS
+
+	def get_effects(self, dword):
+
+		if (cop2.is_cop2(dword)):
+			entry = self.decoder.lookup(dword)
+			if (entry != None):
+				effects, latency = self.effects[entry[0]]
+				return effects(dword) + (latency,)
+
+		return ee_effects(dword) + (FMAC_LATENCY,)
+
+	# Issues words, a sequence of (ea, dword), in order. ready maps resources
+	# to the cycle their value is available and is updated in place.
+	# Returns ([(ea, stall cycles)], cycle after the last instruction).
+	def run(self, words, ready = None, cycle = 0):
+
+		if (ready == None):
+			ready = {}
+
+		stalls = []
+		for ea, dword in words:
+			reads, writes, latency = self.get_effects(dword)
+			issue = cycle
+			for res in reads:
+				if (ready.get(res, 0) > issue):
+					issue = ready[res]
+			for res in writes:
+				ready[res] = issue + result_latency(res, latency)
+			stalls.append((ea, issue - cycle))
+			cycle = issue + 1
+
+		return (stalls, cycle)
+
+	# Returns ([(ea, stall cycles)], cycles) for one pass over a block.
+	def estimate_block(self, words):
+
+		return self.run(words)
+
+	# Same for a loop body in its steady state: the second iteration sees
+	# the results still in flight from the first.
+	def estimate_loop(self, words):
+
+		words = list(words)
+		ready = {}
+		stalls, cycle = self.run(words, ready)
+		stalls, end = self.run(words, ready, cycle)
+
+		return (stalls, end - cycle)
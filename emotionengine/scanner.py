@@ -0,0 +1,83 @@
+# Code-vs-data scanner for raw images: finds runs of words that look like
+# VU0 macro code. Vectorized with NumPy, no IDA dependencies.
+#
+# A word counts as a hit if it is a plausible COP2 macro instruction, BC0
+# or CACHE, or one of the EE side COP2 moves (LQC2/SQC2 with a 16-byte
+# aligned offset, QMFC2/QMTC2 with the reserved bits clear). Windows with
+# a high enough density of hits are merged into runs, trimmed to their
+# first and last hit.
+
+from emotionengine import cop2
+
+# Words per density window, hits needed per window, and minimum hits per
+# reported run.
+WINDOW = 16
+THRESHOLD = 8
+MIN_HITS = 6
+
+# Highest VCALLMS immediate inside VU0 micro memory (4 KB / 8 bytes).
+VCALLMS_LIMIT = 0x200
+
+VCALLMS_INDEX = cop2.ITABLE_NAMES.index("vcallms")
+
+# Boolean hit mask for a little-endian buffer.
+def find_hits(decoder, data):
+
+	import numpy
+
+	special, short = decoder.get_bulk_tables()
+	has_dest = numpy.array(cop2.ITABLE_DEST + (False,), dtype=bool)
+
+	words = numpy.frombuffer(data, dtype='<u4', count=len(data) // 4)
+
+	index = numpy.where((words & 0x3C) == 0x3C, special[words & 0x7FF], short[words & 0x3F])
+	hits = ((words >> 25) == 0x25) & (index >= 0)
+	# An instruction with a dest mask writes at least one field.
+	hits &= ~has_dest[index] | ((words & (0xF << 21)) != 0)
+	hits &= (index != VCALLMS_INDEX) | (((words >> 6) & 0x7FFF) < VCALLMS_LIMIT)
+
+	hits |= (words >> 21) == 0x208
+	hits |= (words >> 26) == 0x2F
+
+	aligned = (words & 0xF) == 0
+	hits |= ((words >> 26) == 0x36) & aligned
+	hits |= ((words >> 26) == 0x3E) & aligned
+	reserved_clear = (words & 0x7FE) == 0
+	hits |= ((words >> 21) == 0x241) & reserved_clear
+	hits |= ((words >> 21) == 0x245) & reserved_clear
+
+	return hits
+
+# Returns [(start_ea, end_ea, hits)] for the likely code runs in data,
+# loaded at base_ea (4-byte aligned).
+def find_code_runs(decoder, data, base_ea, window = WINDOW, threshold = THRESHOLD, min_hits = MIN_HITS):
+
+	import numpy
+
+	hits = find_hits(decoder, data)
+	if (len(hits) < window):
+		return []
+
+	# Hits per window starting at each word.
+	counts = numpy.concatenate(([0], numpy.cumsum(hits, dtype=numpy.int32)))
+	dense = (counts[window:] - counts[:-window]) >= threshold
+
+	# Spread every dense window over the words it covers.
+	covered = numpy.zeros(len(hits) + 1, dtype=numpy.int32)
+	starts = numpy.flatnonzero(dense)
+	covered[starts] += 1
+	covered[starts + window] -= 1
+	covered = numpy.cumsum(covered[:-1]) > 0
+
+	edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([False], covered, [False])).astype(numpy.int8)))
+	hit_positions = numpy.flatnonzero(hits)
+
+	runs = []
+	for start, end in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+		first = numpy.searchsorted(hit_positions, start)
+		last = numpy.searchsorted(hit_positions, end) - 1
+		if (last - first + 1 < min_hits):
+			continue
+		runs.append((base_ea + (int(hit_positions[first]) << 2), base_ea + ((int(hit_positions[last]) + 1) << 2), int(last - first + 1)))
+
+	return runs
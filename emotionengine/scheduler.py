@@ -0,0 +1,133 @@
+# Cooperative scheduler for long passes over a database. No IDA
+# dependencies.
+#
+# A job is a generator that does a bounded piece of work per step and
+# yields its progress as (done, total); its return value is the result.
+# The plugin calls step() from a UI timer, so jobs run on the main thread
+# between UI events and may write to the database directly.
+
+import collections
+import time
+
+# Seconds of work per step() call.
+SLICE_TIME = 0.05
+
+# Progress is reported every tenth of a job.
+REPORT_STEPS = 10
+
+class Job:
+
+	def __init__(self, name, steps, done = None):
+
+		self.name = name
+		self.steps = steps
+		# Called with the job once it has finished.
+		self.done = done
+		self.progress = (0, 0)
+		self.reported = -1
+		self.finished = False
+		self.cancelled = False
+		self.error = None
+		self.result = None
+
+	def percent(self):
+
+		done, total = self.progress
+		return 100 * done // total if total else 0
+
+class Scheduler:
+
+	# report is called with a job on progress, completion, failure and
+	# cancellation.
+	def __init__(self, report = None, slice_time = SLICE_TIME):
+
+		self.jobs = collections.deque()
+		self.report = report
+		self.slice_time = slice_time
+
+	def __len__(self):
+		return len(self.jobs)
+
+	def __contains__(self, name):
+		return any(job.name == name for job in self.jobs)
+
+	# Queues a job, replacing a queued job of the same name.
+	def add(self, job):
+
+		for old in [old for old in self.jobs if old.name == job.name]:
+			self.jobs.remove(old)
+			old.steps.close()
+		self.jobs.append(job)
+		return job
+
+	# Cancels the jobs with the given name (default: all) and returns them.
+	def cancel(self, name = None):
+
+		cancelled = [job for job in self.jobs if name == None or job.name == name]
+		for job in cancelled:
+			self.jobs.remove(job)
+			job.steps.close()
+			job.cancelled = True
+			self.report_job(job)
+		return cancelled
+
+	# Calls report, keeping an exception it raises as the job error so it
+	# never escapes step().
+	def report_job(self, job):
+
+		if (self.report == None):
+			return
+		try:
+			self.report(job)
+		except Exception as e:
+			if (job.error == None):
+				job.error = e
+
+	def finish(self, job):
+
+		self.jobs.remove(job)
+		job.finished = True
+		if (job.error == None and job.done != None):
+			try:
+				job.done(job)
+			except Exception as e:
+				job.error = e
+		self.report_job(job)
+
+	# Runs the jobs round robin for one time slice, at least one step.
+	# Returns True while jobs remain.
+	def step(self):
+
+		deadline = time.perf_counter() + self.slice_time
+		while (self.jobs):
+			job = self.jobs[0]
+			try:
+				job.progress = next(job.steps)
+			except StopIteration as e:
+				job.result = e.value
+				self.finish(job)
+				continue
+			except Exception as e:
+				job.error = e
+				self.finish(job)
+				continue
+
+			self.jobs.rotate(-1)
+			tenth = job.percent() * REPORT_STEPS // 100
+			if (tenth != job.reported):
+				job.reported = tenth
+				self.report_job(job)
+
+			if (time.perf_counter() >= deadline):
+				break
+
+		return bool(self.jobs)
+
+# Runs the steps of a job to the end and returns its result.
+def run_to_end(steps):
+
+	while (True):
+		try:
+			next(steps)
+		except StopIteration as e:
+			return e.value
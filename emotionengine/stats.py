@@ -0,0 +1,110 @@
+# COP2 usage statistics collected in one pass over decoded words. No IDA
+# dependencies; shared by the batch decoder and the plugin.
+
+import collections
+import csv
+
+from emotionengine import cop2
+
+VCALLMS_INDEX = cop2.ITABLE_NAMES.index("vcallms")
+
+class COP2Stats:
+
+	def __init__(self):
+
+		self.words = 0
+		# itable name -> count
+		self.histogram = collections.Counter()
+		# dest suffix -> count, for instructions with a dest mask
+		self.dest_masks = collections.Counter()
+		# BC0 mnemonic -> count, and (ea, target) of every BC0
+		self.bc0 = collections.Counter()
+		self.bc0_targets = []
+		# VU0 address -> VCALLMS count
+		self.vcallms_targets = collections.Counter()
+		# CACHE function -> count
+		self.cache_ops = collections.Counter()
+
+	def add_word(self, decoder, ea, dword):
+
+		if (cop2.is_bc0(dword)):
+			self.bc0[cop2.BC0_NAMES[(dword >> 16) & 3]] += 1
+			self.bc0_targets.append((ea, cop2.bc0_target(ea, dword)))
+		elif (cop2.is_cache(dword)):
+			self.cache_ops[cop2.CACHE_FUNCTIONS[(dword >> 16) & 0x1F]] += 1
+		else:
+			index = decoder.lookup(dword)[0]
+			self.histogram[cop2.ITABLE_NAMES[index]] += 1
+			if (cop2.ITABLE_DEST[index]):
+				self.dest_masks[cop2.DEST_SUFFIXES[(dword >> 21) & 0xF]] += 1
+			if (index == VCALLMS_INDEX):
+				self.vcallms_targets[((dword >> 6) & 0x7FFF) << 3] += 1
+
+	# Adds every COP2, BC0 and CACHE word of data, loaded at base_ea. keep,
+	# if given, filters words by ea.
+	def add_buffer(self, decoder, data, base_ea, keep = None):
+
+		try:
+			result = decoder.decode_buffer(data, base_ea)
+			words = zip(result['ea'].tolist(), result['dword'].tolist())
+		except ImportError:
+			words = decoder.scan_buffer(data, base_ea)
+
+		for ea, dword in words:
+			if (keep == None or keep(ea)):
+				self.add_word(decoder, ea, dword)
+
+	def merge(self, other):
+
+		self.words += other.words
+		self.histogram.update(other.histogram)
+		self.dest_masks.update(other.dest_masks)
+		self.bc0.update(other.bc0)
+		self.bc0_targets.extend(other.bc0_targets)
+		self.vcallms_targets.update(other.vcallms_targets)
+		self.cache_ops.update(other.cache_ops)
+
+	# (section, key, value) rows, used for CSV and the plugin chooser.
+	def rows(self):
+
+		rows = [
+			("total", "words", self.words),
+			("total", "cop2", sum(self.histogram.values())),
+			("total", "bc0", sum(self.bc0.values())),
+			("total", "cache", sum(self.cache_ops.values())),
+		]
+		for name, count in self.histogram.most_common():
+			rows.append(("histogram", name, count))
+		for dest, count in self.dest_masks.most_common():
+			rows.append(("dest_mask", dest, count))
+		for name, count in sorted(self.bc0.items()):
+			rows.append(("bc0_types", name, count))
+		for ea, target in sorted(self.bc0_targets):
+			rows.append(("bc0_target", "0x%X" % ea, "0x%X" % target))
+		for target, count in sorted(self.vcallms_targets.items()):
+			rows.append(("vcallms_target", "0x%X" % target, count))
+		for name, count in self.cache_ops.most_common():
+			rows.append(("cache_op", name, count))
+		return rows
+
+	def to_dict(self):
+
+		return {
+			"words": self.words,
+			"cop2": sum(self.histogram.values()),
+			"bc0": sum(self.bc0.values()),
+			"cache": sum(self.cache_ops.values()),
+			"histogram": dict(self.histogram.most_common()),
+			"dest_masks": dict(self.dest_masks.most_common()),
+			"bc0_types": dict(self.bc0),
+			"bc0_targets": [["0x%X" % ea, "0x%X" % target] for ea, target in sorted(self.bc0_targets)],
+			"vcallms_targets": {"0x%X" % target: count for target, count in sorted(self.vcallms_targets.items())},
+			"cache_ops": dict(self.cache_ops.most_common()),
+		}
+
+	def write_csv(self, path):
+
+		with open(path, "w", newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(("section", "key", "value"))
+			writer.writerows(self.rows())
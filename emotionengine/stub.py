@@ -0,0 +1,44 @@
+# Stand-ins for ida_ua.insn_t/op_t so the decoder core runs without IDA.
+
+UA_MAXOP = 8
+
+class op_t:
+
+	def __init__(self, n = 0):
+		self.n = n
+		self.clear()
+
+	def clear(self):
+		self.type = 0 # o_void
+		self.reg = 0
+		self.value = 0
+		self.addr = 0
+		self.displ = 0
+		self.specval = 0
+		self.shown = True
+
+	def clr_shown(self):
+		self.shown = False
+
+class insn_t:
+
+	def __init__(self, ea = 0):
+		self.ops = [op_t(n) for n in range(UA_MAXOP)]
+		self.Op1, self.Op2, self.Op3, self.Op4, self.Op5, self.Op6 = self.ops[:6]
+		self.crefs = []
+		self.clear(ea)
+
+	def __getitem__(self, n):
+		return self.ops[n]
+
+	def clear(self, ea = 0):
+		self.ea = ea
+		self.itype = 0
+		self.size = 0
+		for op in self.ops:
+			op.clear()
+		del self.crefs[:]
+
+	def add_cref(self, to, opoff, type):
+		self.crefs.append((to, type))
+		return True
@@ -0,0 +1,151 @@
+# Exhaustive decoder check over the whole COP2 subspace (dword >> 25 ==
+# 0x25, 2^25 words), runs without IDA:
+#   python -m emotionengine.verify [-j JOBS] [--update] [CHUNK...]
+#
+# Every word goes through the stub decode and render paths. The decoded
+# text of each 2^20 word chunk is hashed and compared against golden.txt,
+# so an edit to the itable that changes any decoding shows up as a
+# mismatching chunk. The bulk decoder is checked against the scalar one
+# when NumPy is available. Throughput is reported per decoder path.
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+
+from emotionengine.cop2 import COP2Decoder
+from emotionengine.stub import insn_t
+
+COP2_BASE = 0x25 << 25
+CHUNK_BITS = 20
+CHUNK_COUNT = 1 << (25 - CHUNK_BITS)
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.txt")
+
+PATHS = ("decode", "render", "bulk")
+
+# Per-worker decoder, built once per process.
+decoder = None
+
+# Returns (chunk, digest, valid words, {path: seconds}, bulk mismatches).
+def check_chunk(chunk):
+
+	global decoder
+	if (decoder == None):
+		decoder = COP2Decoder()
+
+	start = COP2_BASE + (chunk << CHUNK_BITS)
+	words = range(start, start + (1 << CHUNK_BITS))
+	times = {}
+
+	insn = insn_t()
+	decode = decoder.decode
+	decoded = []
+	begin = time.perf_counter()
+	for dword in words:
+		insn.clear(0)
+		if (decode(insn, dword)):
+			decoded.append((dword, insn.itype, insn.Op1.value, insn.Op2.value, insn.Op3.value))
+	times["decode"] = time.perf_counter() - begin
+
+	render = decoder.render_instruction
+	digest = hashlib.blake2b(digest_size=16)
+	begin = time.perf_counter()
+	for dword, itype, v1, v2, v3 in decoded:
+		name, dest, operands = render(dword)
+		digest.update(("%08X %d %s%s %s %X %X %X\n" % (dword, itype, name, dest, ",".join(op or "" for op in operands), v1, v2, v3)).encode())
+	times["render"] = time.perf_counter() - begin
+
+	mismatches = 0
+	try:
+		import numpy
+
+		data = numpy.arange(start, start + (1 << CHUNK_BITS), dtype='<u4').tobytes()
+		begin = time.perf_counter()
+		result = decoder.decode_buffer(data, 0)
+		times["bulk"] = time.perf_counter() - begin
+		scalar = numpy.array([d[1] - decoder.itype_start for d in decoded], dtype='<i2')
+		if (len(result) != len(scalar)):
+			mismatches = abs(len(result) - len(scalar))
+		else:
+			mismatches = int(numpy.count_nonzero(result['index'] != scalar))
+	except ImportError:
+		pass
+
+	return (chunk, digest.hexdigest(), len(decoded), times, mismatches)
+
+def load_golden(path = GOLDEN_PATH):
+
+	golden = {}
+	if (os.path.exists(path)):
+		with open(path) as f:
+			for line in f:
+				chunk, digest = line.split()
+				golden[int(chunk)] = digest
+	return golden
+
+def write_golden(results, path = GOLDEN_PATH):
+
+	golden = load_golden(path)
+	for chunk, digest, valid, times, mismatches in results:
+		golden[chunk] = digest
+	with open(path, "w") as f:
+		for chunk in sorted(golden):
+			f.write("%d %s\n" % (chunk, golden[chunk]))
+
+# Checks the given chunks (default: all). Returns the number of failures.
+def run(chunks = None, jobs = None, update = False):
+
+	if (not chunks):
+		chunks = range(CHUNK_COUNT)
+
+	with multiprocessing.Pool(jobs) as pool:
+		results = sorted(pool.imap_unordered(check_chunk, chunks))
+
+	golden = load_golden()
+	failures = 0
+	totals = dict.fromkeys(PATHS, 0.0)
+	counts = dict.fromkeys(PATHS, 0)
+	for chunk, digest, valid, times, mismatches in results:
+		status = "ok"
+		if (mismatches):
+			status = "BULK MISMATCH (%d)" % mismatches
+			failures += 1
+		elif (update):
+			status = "updated"
+		elif (chunk not in golden):
+			status = "no golden"
+			failures += 1
+		elif (golden[chunk] != digest):
+			status = "MISMATCH"
+			failures += 1
+		print("chunk %2d  %08X  %8d valid  %s" % (chunk, COP2_BASE + (chunk << CHUNK_BITS), valid, status))
+
+		for path in times:
+			totals[path] += times[path]
+			counts[path] += valid if path == "render" else 1 << CHUNK_BITS
+
+	for path in PATHS:
+		if (totals[path]):
+			print("%-16s %12.0f words/s per process" % (path, counts[path] / totals[path]))
+
+	if (update):
+		write_golden(results)
+
+	return failures
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description="Exhaustive COP2 decoder regression check")
+	parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+	parser.add_argument("--update", action="store_true", help="write the digests to golden.txt")
+	parser.add_argument("chunks", nargs="*", type=int, help="chunks to check, 0-%d (default: all)" % (CHUNK_COUNT - 1))
+	args = parser.parse_args(argv)
+
+	if (run(args.chunks, args.jobs, args.update)):
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,254 @@
+# VU0 micro mode disassembler for microprograms uploaded by VIF MPG
+# packets and started with VCALLMS. No IDA dependencies.
+#
+# A micro instruction is a 64-bit pair: lower word at the even address,
+# upper word (with the I/E/M/D/T flags) at +4. Upper instructions and
+# the "lower op" register forms share their encoding with the COP2
+# macro instructions, so they are decoded with the itable.
+
+import collections
+import hashlib
+import struct
+
+from emotionengine.cop2 import COP2Decoder, ITABLE, ITABLE_OPCODES, ITABLE_NAMES, ITABLE_DTS, FIELD_NAMES
+
+VU0_MICRO_SIZE = 0x1000
+
+# VIFcode MPG: cmd (bits 24-30), num (bits 16-23), addr (bits 0-15).
+MPG_CMD = 0x4A
+
+# Number of decoded programs kept around.
+PROGRAM_CACHE_SIZE = 256
+
+# Upper word flags.
+FLAG_I = 1 << 31
+FLAG_E = 1 << 30
+FLAG_M = 1 << 29
+FLAG_D = 1 << 28
+FLAG_T = 1 << 27
+
+UPPER_FLAGS = ((FLAG_I, "I"), (FLAG_E, "E"), (FLAG_M, "M"), (FLAG_D, "D"), (FLAG_T, "T"))
+
+# Lower instructions with a 7-bit opcode in bits 25-31.
+LOWER_OPS = {
+	0x00: "lq{dest} vf{ft}, {imm11}(vi{is})",
+	0x01: "sq{dest} vf{fs}, {imm11}(vi{it})",
+	0x04: "ilw{dest} vi{it}, {imm11}(vi{is})",
+	0x05: "isw{dest} vi{it}, {imm11}(vi{is})",
+	0x08: "iaddiu vi{it}, vi{is}, 0x{imm15:X}",
+	0x09: "isubiu vi{it}, vi{is}, 0x{imm15:X}",
+	0x10: "fceq vi1, 0x{imm24:X}",
+	0x11: "fcset 0x{imm24:X}",
+	0x12: "fcand vi1, 0x{imm24:X}",
+	0x13: "fcor vi1, 0x{imm24:X}",
+	0x14: "fseq vi{it}, 0x{imm12:X}",
+	0x15: "fsset 0x{imm12:X}",
+	0x16: "fsand vi{it}, 0x{imm12:X}",
+	0x17: "fsor vi{it}, 0x{imm12:X}",
+	0x18: "fmeq vi{it}, vi{is}",
+	0x1A: "fmand vi{it}, vi{is}",
+	0x1B: "fmor vi{it}, vi{is}",
+	0x1C: "fcget vi{it}",
+	0x20: "b 0x{target:X}",
+	0x21: "bal vi{it}, 0x{target:X}",
+	0x24: "jr vi{is}",
+	0x25: "jalr vi{it}, vi{is}",
+	0x28: "ibeq vi{it}, vi{is}, 0x{target:X}",
+	0x29: "ibne vi{it}, vi{is}, 0x{target:X}",
+	0x2C: "ibltz vi{is}, 0x{target:X}",
+	0x2D: "ibgtz vi{is}, 0x{target:X}",
+	0x2E: "iblez vi{is}, 0x{target:X}",
+	0x2F: "ibgez vi{is}, 0x{target:X}",
+}
+
+# Opcodes of LOWER_OPS that branch to {target}.
+LOWER_BRANCHES = frozenset((0x20, 0x21, 0x28, 0x29, 0x2C, 0x2D, 0x2E, 0x2F))
+
+# Lower register ops (bit 31 set) that only exist in micro mode.
+LOWER_SPECIAL = {
+	0x67C: "mfp{dest} vf{ft}, P",
+	0x6BC: "xtop vi{it}",
+	0x6BD: "xitop vi{it}",
+	0x6FC: "xgkick vi{is}",
+	0x73C: "esadd P, vf{fs}",
+	0x73D: "ersadd P, vf{fs}",
+	0x73E: "eleng P, vf{fs}",
+	0x73F: "erleng P, vf{fs}",
+	0x77C: "eatanxy P, vf{fs}",
+	0x77D: "eatanxz P, vf{fs}",
+	0x77E: "esum P, vf{fs}",
+	0x7BC: "esqrt P, vf{fs}{fsf}",
+	0x7BD: "ersqrt P, vf{fs}{fsf}",
+	0x7BE: "ercpr P, vf{fs}{fsf}",
+	0x7BF: "waitp",
+	0x7FC: "esin P, vf{fs}{fsf}",
+	0x7FD: "eatan P, vf{fs}{fsf}",
+	0x7FE: "eexp P, vf{fs}{fsf}",
+}
+
+# itable entries valid as upper instructions (FMAC ops) and as lower
+# register ops (integer, load/store, FDIV, random unit).
+def is_upper_opcode(opcode):
+	if (opcode & 0x3C == 0x3C):
+		return opcode < 0x300
+	return opcode < 0x30
+
+def is_lower_opcode(opcode):
+	if (opcode & 0x3C == 0x3C):
+		return opcode >= 0x300
+	return opcode >= 0x30 and opcode <= 0x35
+
+UPPER_INDEXES = frozenset(i for i in range(len(ITABLE)) if is_upper_opcode(ITABLE_OPCODES[i]))
+LOWER_INDEXES = frozenset(i for i in range(len(ITABLE)) if is_lower_opcode(ITABLE_OPCODES[i]))
+
+# Micro mode mnemonics drop the macro mode "v" prefix.
+MICRO_NAMES = tuple(name[1:] for name in ITABLE_NAMES)
+
+# One decoded micro instruction. target is the branch target or None.
+MicroInsn = collections.namedtuple("MicroInsn", ("addr", "lower", "upper", "flags", "upper_text", "lower_text", "target"))
+
+def sign_extend(value, bits):
+	if (value & (1 << (bits - 1))):
+		return value - (1 << bits)
+	return value
+
+def lower_fields(word, addr):
+
+	imm11 = sign_extend(word & 0x7FF, 11)
+	return {
+		"dest": "." + "".join(FIELD_NAMES[i] for i in range(4) if (word >> (24 - i)) & 1),
+		"ft": (word >> 16) & 0x1F,
+		"fs": (word >> 11) & 0x1F,
+		"it": (word >> 16) & 0x1F,
+		"is": (word >> 11) & 0x1F,
+		"fsf": FIELD_NAMES[(word >> 21) & 3],
+		"imm11": imm11,
+		"imm12": (((word >> 21) & 1) << 11) | (word & 0x7FF),
+		"imm15": (((word >> 21) & 0xF) << 11) | (word & 0x7FF),
+		"imm24": word & 0xFFFFFF,
+		"target": (addr + 8 + imm11 * 8) & (VU0_MICRO_SIZE - 1),
+	}
+
+# Finds VIF MPG packets in a buffer. Returns (ea of code, VU0 address,
+# code bytes) for packets that fit both the buffer and VU0 micro memory.
+def find_mpg_packets(data, base_ea):
+
+	packets = []
+	# The code after MPG is 64-bit aligned, so the VIFcode is at 4 mod 8.
+	offset = (4 - base_ea) & 7
+	while (offset + 4 <= len(data)):
+		vifcode = struct.unpack_from("<I", data, offset)[0]
+		if ((vifcode >> 24) & 0x7F == MPG_CMD):
+			num = (vifcode >> 16) & 0xFF or 0x100
+			vu_addr = (vifcode & 0xFFFF) << 3
+			size = num << 3
+			if (vu_addr + size <= VU0_MICRO_SIZE and offset + 4 + size <= len(data)):
+				packets.append((base_ea + offset + 4, vu_addr, bytes(data[offset + 4:offset + 4 + size])))
+		offset += 8
+
+	return packets
+
+class VU0MicroDecoder:
+
+	def __init__(self, cop2 = None):
+
+		if (cop2 == None):
+			cop2 = COP2Decoder()
+		self.cop2 = cop2
+
+		# (blob digest, base, start) -> tuple of MicroInsn, oldest first.
+		self.programs = collections.OrderedDict()
+
+	def format_itable(self, word, index):
+
+		name, dest, operands = self.cop2.render(word)
+		text = MICRO_NAMES[index] + dest
+		args = []
+		for operand in operands:
+			if (operand != None):
+				args.append(operand)
+			elif (ITABLE_DTS[index] == 15):
+				# IADDI immediate is signed 5-bit in micro mode.
+				args.append("%d" % sign_extend((word >> 6) & 0x1F, 5))
+		if (args):
+			text += " " + ", ".join(args)
+		return text
+
+	def decode_upper(self, word):
+
+		decoder = self.cop2.lookup(word)
+		if (decoder == None or decoder[0] not in UPPER_INDEXES):
+			return "??? 0x%08X" % word
+		return self.format_itable(word, decoder[0])
+
+	# Returns (text, branch target or None).
+	def decode_lower(self, word, addr):
+
+		if (word & 0x80000000):
+			decoder = self.cop2.lookup(word)
+			if (decoder != None and decoder[0] in LOWER_INDEXES):
+				return (self.format_itable(word, decoder[0]), None)
+			if (word & 0x3C == 0x3C and (word & 0x7FF) in LOWER_SPECIAL):
+				return (LOWER_SPECIAL[word & 0x7FF].format(**lower_fields(word, addr)), None)
+			return ("??? 0x%08X" % word, None)
+
+		opcode = word >> 25
+		if (opcode not in LOWER_OPS):
+			return ("??? 0x%08X" % word, None)
+
+		fields = lower_fields(word, addr)
+		target = None
+		if (opcode in LOWER_BRANCHES):
+			target = fields["target"]
+		return (LOWER_OPS[opcode].format(**fields), target)
+
+	def decode_instruction(self, addr, lower, upper):
+
+		flags = "".join(name for flag, name in UPPER_FLAGS if upper & flag)
+		upper_text = self.decode_upper(upper)
+
+		# With the I bit set the lower word is the float loaded into I.
+		if (upper & FLAG_I):
+			value = struct.unpack("<f", struct.pack("<I", lower))[0]
+			return MicroInsn(addr, lower, upper, flags, upper_text, "loi %g" % value, None)
+
+		lower_text, target = self.decode_lower(lower, addr)
+		return MicroInsn(addr, lower, upper, flags, upper_text, lower_text, target)
+
+	# Decodes a microprogram from VU0 address start until the instruction
+	# after the one with the E bit, or the end of the blob. base is the
+	# VU0 address of blob[0]. Results are cached per blob contents.
+	def decode_program(self, blob, start, base = 0):
+
+		blob = bytes(blob)
+		key = (hashlib.sha1(blob).digest(), base, start)
+		program = self.programs.get(key)
+		if (program != None):
+			self.programs.move_to_end(key)
+			return program
+
+		insns = []
+		offset = (start - base) & ~7
+		end_at = None
+		while (offset >= 0 and offset + 8 <= len(blob) and len(insns) < VU0_MICRO_SIZE // 8):
+			lower, upper = struct.unpack_from("<II", blob, offset)
+			insn = self.decode_instruction(base + offset, lower, upper)
+			insns.append(insn)
+			if (end_at != None):
+				break
+			if (upper & FLAG_E):
+				end_at = insn.addr + 8
+			offset += 8
+
+		program = tuple(insns)
+		self.programs[key] = program
+		if (len(self.programs) > PROGRAM_CACHE_SIZE):
+			self.programs.popitem(last=False)
+		return program
+
+	def format_program(self, program):
+
+		lines = []
+		for insn in program:
+			lines.append("0x%04X: %-5s %-36s %s" % (insn.addr, insn.flags, insn.upper_text, insn.lower_text))
+		return lines
@@ -1,725 +1,875 @@
 # This plugin helps IDA Pro to disassemble PS2 Emotion Engine COP2 instructions
 # Author: oct0xor
 
+import os
+import sys
+import traceback
 import idaapi
 import ida_ida
 import ida_allins
 import ida_idp
 import ida_bytes
 import ida_ua
+import ida_segment
+import ida_auto
+import ida_funcs
+import ida_gdl
+import ida_kernwin
 import idc
 
+# The decoder core lives in the emotionengine package next to this file.
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+if (PLUGIN_DIR not in sys.path):
+	sys.path.append(PLUGIN_DIR)
+
+from emotionengine import cop2
+from emotionengine.cop2 import COP2Decoder
+from emotionengine import vu0micro
+from emotionengine.vu0micro import VU0MicroDecoder
+from emotionengine.chunkindex import ChunkIndex
+from emotionengine import decodeindex
+from emotionengine.pipeline import StallEstimator
+from emotionengine import defuse
+from emotionengine.defuse import DefUseCache
+from emotionengine.hookprof import HookProfiler
+from emotionengine import export
+from emotionengine import scanner
+from emotionengine.ngram import NgramIndex
+from emotionengine.stats import COP2Stats
+from emotionengine.scheduler import Scheduler, Job, run_to_end
+
 ITYPE_START = ida_idp.CUSTOM_INSN_ITYPE + 0x100
+OWN_ITYPES = frozenset(range(ITYPE_START, ITYPE_START + len(cop2.ITABLE)))
+
+# Decode index sidecar, next to the .idb/.i64.
+INDEX_EXTENSION = ".cop2idx"
 MNEM_WIDTH = 13
 
+# Plugin run() arguments.
+RUN_TOGGLE_AUTOCMT = 1
+RUN_SHOW_VU0_PROGRAM = 2
+RUN_REFRESH_CHANGED = 3
+RUN_ESTIMATE_STALLS = 4
+RUN_SHOW_DEFUSE = 5
+RUN_TOGGLE_PROFILING = 6
+RUN_PROFILE_REPORT = 7
+RUN_EXPORT_ASM = 8
+RUN_SCAN_UNEXPLORED = 9
+RUN_FIND_PATTERN = 10
+RUN_DB_STATS = 11
+RUN_CANCEL_JOBS = 12
+
+# Background jobs: timer interval in milliseconds, and bytes read per step
+# (a multiple of the chunk index size).
+JOB_INTERVAL = 20
+JOB_CHUNK_SIZE = 0x40000
+
+# Hooks wrapped while profiling.
+PROFILED_HOOKS = ("ev_ana_insn", "ev_emu_insn", "ev_out_operand", "ev_out_mnem", "ev_get_autocmt", "ev_is_basic_block_end")
+
+# Stall comments start with this so reruns can replace them.
+STALL_CMT_PREFIX = "COP2 stall"
+
 class COP2_disassemble(idaapi.IDP_Hooks):
 
 	def __init__(self):
 		idaapi.IDP_Hooks.__init__(self)
 
-		class idef:
-			def __init__(self, opcode, name, dt, dest, cmt):
-				self.opcode = opcode
-				self.name = name
-				self.dt = dt
-				self.dest = dest
-				self.cmt = cmt
-
-		self.itable = [
-			# Coprocessor Calculation Instructions
-			idef(0x1FD, "VABS",      1, True,  "Absolute"),
-			idef(0x028, "VADD",      2, True,  "Addition"),
-			idef(0x022, "VADDi",     3, True,  "ADD broadcast I register"),
-			idef(0x020, "VADDq",     4, True,  "ADD broadcast Q register"),
-			idef(0x000, "VADDx",    23, True,  "ADD broadcast bc field"),
-			idef(0x001, "VADDy",    23, True,  "ADD broadcast bc field"),
-			idef(0x002, "VADDz",    23, True,  "ADD broadcast bc field"),
-			idef(0x003, "VADDw",    23, True,  "ADD broadcast bc field"),
-			idef(0x2BC, "VADDA",     5, True,  "ADD output to ACC"),
-			idef(0x23E, "VADDAi",    6, True,  "ADD output to ACC broadcast I register"),
-			idef(0x23C, "VADDAq",    7, True,  "ADD output to ACC broadcast Q register"),
-			idef(0x03C, "VADDAx",    8, True,  "ADD output to ACC broadcast bc field"),
-			idef(0x03D, "VADDAy",    8, True,  "ADD output to ACC broadcast bc field"),
-			idef(0x03E, "VADDAz",    8, True,  "ADD output to ACC broadcast bc field"),
-			idef(0x03F, "VADDAw",    8, True,  "ADD output to ACC broadcast bc field"),
-			idef(0x02C, "VSUB",      2, True,  "Subtraction"),
-			idef(0x026, "VSUBi",     3, True,  "SUB broadcast I register"),
-			idef(0x024, "VSUBq",     4, True,  "SUB broadcast Q register"),
-			idef(0x004, "VSUBx",    23, True,  "SUB broadcast bc field"),
-			idef(0x005, "VSUBy",    23, True,  "SUB broadcast bc field"),
-			idef(0x006, "VSUBz",    23, True,  "SUB broadcast bc field"),
-			idef(0x007, "VSUBw",    23, True,  "SUB broadcast bc field"),
-			idef(0x2FC, "VSUBA",     5, True,  "SUB output to ACC"),
-			idef(0x27E, "VSUBAi",    6, True,  "SUB output to ACC broadcast I register"),
-			idef(0x27C, "VSUBAq",    7, True,  "SUB output to ACC broadcast Q register"),
-			idef(0x07C, "VSUBAx",    8, True,  "SUB output to ACC broadcast bc field"),
-			idef(0x07D, "VSUBAy",    8, True,  "SUB output to ACC broadcast bc field"),
-			idef(0x07E, "VSUBAz",    8, True,  "SUB output to ACC broadcast bc field"),
-			idef(0x07F, "VSUBAw",    8, True,  "SUB output to ACC broadcast bc field"),
-			idef(0x02A, "VMUL",      2, True,  "Multiply"),
-			idef(0x01E, "VMULi",     3, True,  "MUL broadcast I register"),
-			idef(0x01C, "VMULq",     4, True,  "MUL broadcast Q register"),
-			idef(0x018, "VMULx",    23, True,  "MUL broadcast bc field"),
-			idef(0x019, "VMULy",    23, True,  "MUL broadcast bc field"),
-			idef(0x01A, "VMULz",    23, True,  "MUL broadcast bc field"),
-			idef(0x01B, "VMULw",    23, True,  "MUL broadcast bc field"),
-			idef(0x2BE, "VMULA",     5, True,  "MUL output to ACC"),
-			idef(0x1FE, "VMULAi",    6, True,  "MUL output to ACC broadcast I register"),
-			idef(0x1FC, "VMULAq",    7, True,  "MUL output to ACC broadcast Q register"),
-			idef(0x1BC, "VMULAx",    8, True,  "MUL output to ACC broadcast bc field"),
-			idef(0x1BD, "VMULAy",    8, True,  "MUL output to ACC broadcast bc field"),
-			idef(0x1BE, "VMULAz",    8, True,  "MUL output to ACC broadcast bc field"),
-			idef(0x1BF, "VMULAw",    8, True,  "MUL output to ACC broadcast bc field"),
-			idef(0x029, "VMADD",     2, True,  "MUL and ADD"),
-			idef(0x023, "VMADDi",    3, True,  "MUL and ADD broadcast I register"),
-			idef(0x021, "VMADDq",    4, True,  "MUL and ADD broadcast Q register"),
-			idef(0x008, "VMADDx",   23, True,  "MUL and ADD broadcast bc field"),
-			idef(0x009, "VMADDy",   23, True,  "MUL and ADD broadcast bc field"),
-			idef(0x00A, "VMADDz",   23, True,  "MUL and ADD broadcast bc field"),
-			idef(0x00B, "VMADDw",   23, True,  "MUL and ADD broadcast bc field"),
-			idef(0x2BD, "VMADDA",    5, True,  "MUL and ADD output to ACC"),
-			idef(0x23F, "VMADDAi",   6, True,  "MUL and ADD output to ACC broadcast I register"),
-			idef(0x23D, "VMADDAq",   7, True,  "MUL and ADD output to ACC broadcast Q register"),
-			idef(0x0BC, "VMADDAx",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
-			idef(0x0BD, "VMADDAy",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
-			idef(0x0BE, "VMADDAz",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
-			idef(0x0BF, "VMADDAw",   8, True,  "MUL and ADD output to ACC broadcast bc field"),
-			idef(0x02D, "VMSUB",     2, True,  "MUL and SUB"),
-			idef(0x027, "VMSUBi",    3, True,  "MUL and SUB broadcast I register"),
-			idef(0x025, "VMSUBq",    4, True,  "MUL and SUB broadcast Q register"),
-			idef(0x00C, "VMSUBx",   23, True,  "MUL and SUB broadcast bc field"),
-			idef(0x00D, "VMSUBy",   23, True,  "MUL and SUB broadcast bc field"),
-			idef(0x00E, "VMSUBz",   23, True,  "MUL and SUB broadcast bc field"),
-			idef(0x00F, "VMSUBw",   23, True,  "MUL and SUB broadcast bc field"),
-			idef(0x2FD, "VMSUBA",    5, True,  "MUL and SUB output to ACC"),
-			idef(0x27F, "VMSUBAi",   6, True,  "MUL and SUB output to ACC broadcast I register"),
-			idef(0x27D, "VMSUBAq",   7, True,  "MUL and SUB output to ACC broadcast Q register"),
-			idef(0x0FC, "VMSUBAx",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
-			idef(0x0FD, "VMSUBAy",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
-			idef(0x0FE, "VMSUBAz",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
-			idef(0x0FF, "VMSUBAw",   8, True,  "MUL and SUB output to ACC broadcast bc field"),
-			idef(0x02B, "VMAX",      2, True,  "Maximum"),
-			idef(0x01D, "VMAXi",     3, True,  "Maximum broadcast I register"),
-			idef(0x010, "VMAXx",    23, True,  "Maximum broadcast bc field"),
-			idef(0x011, "VMAXy",    23, True,  "Maximum broadcast bc field"),
-			idef(0x012, "VMAXz",    23, True,  "Maximum broadcast bc field"),
-			idef(0x013, "VMAXw",    23, True,  "Maximum broadcast bc field"),
-			idef(0x02F, "VMINI",     2, True,  "Minimum"),
-			idef(0x01F, "VMINIi",    3, True,  "Minimum broadcast I register"),
-			idef(0x014, "VMINIx",   23, True,  "Minimum broadcast bc field"),
-			idef(0x015, "VMINIy",   23, True,  "Minimum broadcast bc field"),
-			idef(0x016, "VMINIz",   23, True,  "Minimum broadcast bc field"),
-			idef(0x017, "VMINIw",   23, True,  "Minimum broadcast bc field"),
-			idef(0x2FE, "VOPMULA",   9, False, "Outer product MULA"),
-			idef(0x02E, "VOPMSUB",  10, False, "Outer product MSUB"),
-			idef(0x2FF, "VNOP",      0, False, "No operation"),
-			idef(0x17C, "VFTOI0",    1, True,  "Float to integer, fixed point 0 bit"),
-			idef(0x17D, "VFTOI4",    1, True,  "Float to integer, fixed point 4 bits"),
-			idef(0x17E, "VFTOI12",   1, True,  "Float to integer, fixed point 12 bits"),
-			idef(0x17F, "VFTOI15",   1, True,  "Float to integer, fixed point 15 bits"),
-			idef(0x13C, "VITOF0",    1, True,  "Integer to float, fixed point 0 bit"),
-			idef(0x13D, "VITOF4",    1, True,  "Integer to float, fixed point 4 bits"),
-			idef(0x13E, "VITOF12",   1, True,  "Integer to float, fixed point 12 bits"),
-			idef(0x13F, "VITOF15",   1, True,  "Integer to float, fixed point 15 bits"),
-			idef(0x1FF, "VCLIP",    11, False, "Clipping"),
-			idef(0x3BC, "VDIV",     12, False, "Floating divide"),
-			idef(0x3BD, "VSQRT",    13, False, "Floating square-root"),
-			idef(0x3BE, "VRSQRT",   12, False, "Floating reciprocal square-root"),
-			idef(0x030, "VIADD",    14, False, "Integer ADD"),
-			idef(0x032, "VIADDI",   15, False, "Integer ADD immediate"),
-			idef(0x034, "VIAND",    14, False, "Integer AND"),
-			idef(0x035, "VIOR",     14, False, "Integer OR"),
-			idef(0x031, "VISUB",    14, False, "Integer SUB"),
-			idef(0x33C, "VMOVE",    16, True,  "Move floating register"),
-			idef(0x3FD, "VMFIR",    17, True,  "Move from integer register"),
-			idef(0x3FC, "VMTIR",    18, False, "Move to integer register"),
-			idef(0x33D, "VMR32",    16, True,  "Rotate right 32 bits"),
-			idef(0x37E, "VLQD",     26, True,  "Load quadword with pre-decrement"),
-			idef(0x37C, "VLQI",     25, True,  "Load quadword with post-increment"),
-			idef(0x37F, "VSQD",     24, True,  "Store quadword with pre-decrement"),
-			idef(0x37D, "VSQI",     19, True,  "Store quadword with post-increment"),
-			idef(0x3FE, "VILWR",    20, True,  "Integer load word register"),
-			idef(0x3FF, "VISWR",    20, True,  "Integer store word register"),
-			idef(0x43E, "VRINIT",   21, False, "Random-unit init R register"),
-			idef(0x43D, "VRGET",    22, True,  "Random-unit get R register"),
-			idef(0x43C, "VRNEXT",   22, True,  "Random-unit next M sequence"),
-			idef(0x43F, "VRXOR",    21, False, "Random-unit XOR R register"),
-			idef(0x3BF, "VWAITQ",    0, False, "Wait Q register"),
-			idef(0x038, "VCALLMS",  27, False, "Start Micro Sub-Routime"),
-			idef(0x039, "VCALLMSR",  0, False, "Start Micro Sub-Routime by Register"),
-		]
-		
-		self.CFC2_ITABLE_ID  = ida_allins.MIPS_cfc2
-		self.CTC2_ITABLE_ID  = ida_allins.MIPS_ctc2
-		self.QMFC2_ITABLE_ID = ida_allins.MIPS_qmfc2
-		self.QMTC2_ITABLE_ID = ida_allins.MIPS_qmtc2
-		self.LQC2_ITABLE_ID  = ida_allins.MIPS_lqc2
-		self.SQC2_ITABLE_ID  = ida_allins.MIPS_sqc2
+		self.decoder = COP2Decoder(ITYPE_START)
+		self.itable = self.decoder.itable
+		self.autocmts = self.decoder.autocmts
 
-		self.VF_REG = 0
-		self.VI_REG = 1
-		self.VI_REG_DEC = 2
-		self.VI_REG_INC = 3
-		self.VF_REG_WITH_F = 4
-		self.VF_REG_WITH_F2 = 5
-		self.CTL_REG = 6
-		self.CTL_ACC = 7
-		self.VCALLMS = 8
-		self.AUTOCMT = 9
-		self.BC0F = 0x100
-		self.BC0T = 0x101
-		self.BC0FL = 0x102
-		self.BC0TL = 0x103
-		self.CACHE = 0x200
-
-		self.reg_types = {
-			0:  [],
-			1:  [self.VF_REG,  self.VF_REG],
-			2:  [self.VF_REG,  self.VF_REG, self.VF_REG],
-			3:  [self.VF_REG,  self.VF_REG, self.CTL_REG],
-			4:  [self.VF_REG,  self.VF_REG, self.CTL_REG],
-			5:  [self.CTL_ACC, self.VF_REG, self.VF_REG],
-			6:  [self.CTL_ACC, self.VF_REG, self.CTL_REG],
-			7:  [self.CTL_ACC, self.VF_REG, self.CTL_REG],
-			8:  [self.CTL_ACC, self.VF_REG, self.VF_REG_WITH_F2],
-			9:  [self.CTL_ACC, self.VF_REG, self.VF_REG],
-			10: [self.VF_REG,  self.VF_REG, self.VF_REG],
-			11: [self.VF_REG,  self.VF_REG],
-			12: [self.CTL_REG, self.VF_REG_WITH_F, self.VF_REG_WITH_F],
-			13: [self.CTL_REG, self.VF_REG_WITH_F],
-			14: [self.VI_REG,  self.VI_REG, self.VI_REG],
-			15: [self.VI_REG,  self.VI_REG],
-			16: [self.VF_REG,  self.VF_REG],
-			17: [self.VF_REG,  self.VI_REG],
-			18: [self.VI_REG,  self.VF_REG_WITH_F],
-			19: [self.VF_REG,  self.VI_REG_INC],
-			20: [self.VI_REG,  self.VI_REG],
-			21: [self.CTL_REG, self.VF_REG_WITH_F],
-			22: [self.VF_REG,  self.CTL_REG],
-			23: [self.VF_REG,  self.VF_REG, self.VF_REG_WITH_F2],
-			24: [self.VF_REG,  self.VI_REG_DEC],
-			25: [self.VF_REG,  self.VI_REG_INC],
-			26: [self.VF_REG,  self.VI_REG_DEC],
-			27: [],
-		}
+		# Auto comments can be switched off on huge databases.
+		self.autocmt = True
 
-		self.itable.sort(key=lambda x: x.opcode)
-
-		for entry in self.itable:
-			entry.name = entry.name.lower()
-
-		for i in range(len(self.itable)):
-			if (self.itable[i].opcode & 0xF00 == 0x100):
-				self.pos_0x100 = i
-				break
-
-		for i in range(len(self.itable)):
-			if (self.itable[i].opcode & 0xF00 == 0x200):
-				self.pos_0x200 = i
-				break
-
-		for i in range(len(self.itable)):
-			if (self.itable[i].opcode & 0xF00 == 0x300):
-				self.pos_0x300 = i
-				break
-
-		for i in range(len(self.itable)):
-			if (self.itable[i].opcode & 0xF00 == 0x400):
-				self.pos_0x400 = i
-				break
-
-	def set_regs_2(self, insn, a, b):
-		insn.Op1.type = ida_ua.o_idpspec1
-		insn.Op1.reg = a
-		insn.Op2.type = ida_ua.o_idpspec1
-		insn.Op2.reg = b
-
-	def set_regs_3(self, insn, a, b, c):
-		insn.Op1.type = ida_ua.o_idpspec1
-		insn.Op1.reg = a
-		insn.Op2.type = ida_ua.o_idpspec1
-		insn.Op2.reg = b
-		insn.Op3.type = ida_ua.o_idpspec1
-		insn.Op3.reg = c
-
-	def decode_type_0(self, insn, dword):
-		insn.Op1.type = ida_ua.o_void
-
-	def decode_type_1(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg)
-
-	def decode_type_2(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		fdreg = (dword >> 6) & 0x1F
-		self.set_regs_3(insn, fdreg, fsreg, ftreg)
-
-	def decode_type_3(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		fdreg = (dword >> 6) & 0x1F
-		self.set_regs_3(insn, fdreg, fsreg, ord('I'))
-
-	def decode_type_4(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		fdreg = (dword >> 6) & 0x1F
-		self.set_regs_3(insn, fdreg, fsreg, ord('Q'))
-
-	def decode_type_5(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_3(insn, ord('A'), fsreg, ftreg)
-
-	def decode_type_6(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_3(insn, ord('A'), fsreg, ord('I'))
-
-	def decode_type_7(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_3(insn, ord('A'), fsreg, ord('Q'))
-
-	def decode_type_8(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_3(insn, ord('A'), fsreg, ftreg)
-
-	def decode_type_9(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_3(insn, ord('A'), fsreg, ftreg)
-
-	def decode_type_10(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		fdreg = (dword >> 6) & 0x1F
-		self.set_regs_3(insn, fdreg, fsreg, ftreg)
-
-	def decode_type_11(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, fsreg, ftreg)
-
-	def decode_type_12(self, insn, dword):
-		ftf = (dword >> 0x17) & 3
-		fsf = (dword >> 0x15) & 3
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_3(insn, ord('Q'), fsreg | (fsf << 8), ftreg | (ftf << 8))
-
-	def decode_type_13(self, insn, dword):
-		ftf = (dword >> 0x17) & 3
-		fsf = (dword >> 0x15) & 3
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ord('Q'), ftreg | (ftf << 8))
-
-	def decode_type_14(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		fdreg = (dword >> 6) & 0x1F
-		self.set_regs_3(insn, fdreg, fsreg, ftreg)
-
-	def decode_type_15(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		imm = (dword >> 6) & 0x1F
-		insn.Op1.type = ida_ua.o_idpspec1
-		insn.Op1.reg = ftreg
-		insn.Op2.type = ida_ua.o_idpspec1
-		insn.Op2.reg = fsreg
-		insn.Op3.type = ida_ua.o_imm
-		insn.Op3.value = imm
-
-	def decode_type_16(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg)
-
-	def decode_type_17(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg)
-
-	def decode_type_18(self, insn, dword):
-		ftf = (dword >> 0x17) & 3
-		fsf = (dword >> 0x15) & 3
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg | (fsf << 8))
-
-	def decode_type_19(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, fsreg, ftreg)
-
-	def decode_type_20(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg)
-
-	def decode_type_21(self, insn, dword):
-		ftf = (dword >> 0x17) & 3
-		fsf = (dword >> 0x15) & 3
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ord('R'), fsreg | (fsf << 8))
-
-	def decode_type_22(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, ord('R'))	
-
-	def decode_type_23(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		fdreg = (dword >> 6) & 0x1F
-		self.set_regs_3(insn, fdreg, fsreg, ftreg)
-		
-	def decode_type_24(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, fsreg, ftreg)
-
-	def decode_type_25(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg)
-
-	def decode_type_26(self, insn, dword):
-		ftreg = (dword >> 0x10) & 0x1F
-		fsreg = (dword >> 0xB) & 0x1F
-		self.set_regs_2(insn, ftreg, fsreg)
-
-	def decode_type_27(self, insn, dword):
-	
-		imm = (dword >> 6) & 0x7FFF
-		insn.Op1.type = ida_ua.o_void
-		insn.Op1.value = imm
-		insn.Op1.specval = 8
-
-	def decode_type_bc0(self, insn, dword):
-	
-		displ = dword & 0xFFFF
-		if (displ > 0x7FFF):
-			displ = ~displ
-			displ &= 0xFFFF
-			displ <<= 2
-			target = insn.ea - displ
-		else:
-			displ <<= 2
-			displ &= 0xFFFF
-			target = insn.ea + displ + 4
+		self.micro = VU0MicroDecoder(self.decoder)
+		self.mpg_packets = None
 
-		insn.Op1.type = ida_ua.o_near
-		insn.Op1.addr = target
-		insn.Op1.specval = (dword >> 16) & 3
-		insn.Op1.specval += 0x100
-		insn.size = 4
+		# Filled after the first auto-analysis, then kept up to date.
+		self.chunks = ChunkIndex(self.decoder)
+		self.indexed = False
 
-	def decode_type_cache(self, insn, dword):
-		insn.Op1.type = ida_ua.o_void
-		insn.Op1.value = (dword >>16) & 0x1F
-		insn.Op1.specval = self.CACHE
-		insn.Op2.type = ida_ua.o_displ
-		insn.Op2.displ = dword & 0xFFFF # Todo: Is that normal int16 displ or what?
-		insn.Op2.reg = (dword >> 21) & 0x1F
-		insn.size = 4
+		# Decode index saved with the database, only kept while the
+		# database is unchanged since the save.
+		self.index = None
 
+		self.stalls = StallEstimator(self.decoder)
+		self.defuse = DefUseCache(self.decoder)
 
-	def set_reg_type(self, op, reg_type):
-		op.specval = reg_type
+		# Pattern index over the COP2 code, built on first search.
+		self.ngrams = None
+		self.last_pattern = ""
 
-	def decode_instruction(self, index, insn, dword):
+		# Off by default, see set_profiling().
+		self.profiler = None
+		self.profiling = False
 
-		insn.itype = ITYPE_START + index
+		# Whole-database passes run in time slices from a UI timer.
+		self.scheduler = Scheduler(self.report_job)
+		self.timer = None
 
-		decoder = getattr(self, 'decode_type_%d' % self.itable[index].dt)
-		decoder(insn, dword)
+		self.CFC2_ITABLE_ID  = ida_allins.MIPS_cfc2
+		self.CTC2_ITABLE_ID  = ida_allins.MIPS_ctc2
+		self.QMFC2_ITABLE_ID = ida_allins.MIPS_qmfc2
+		self.QMTC2_ITABLE_ID = ida_allins.MIPS_qmtc2
+		self.LQC2_ITABLE_ID  = ida_allins.MIPS_lqc2
+		self.SQC2_ITABLE_ID  = ida_allins.MIPS_sqc2
 
-		regs = self.reg_types[self.itable[index].dt]
+		# Everything else leaves the hooks after a single set/dict lookup.
+		self.own_itypes = OWN_ITYPES
+
+		self.operand_handlers = dict.fromkeys(self.own_itypes, self.out_cop2_operand)
+		self.operand_handlers[cop2.NULL_ITYPE] = self.out_special_operand
+		self.operand_handlers[self.CFC2_ITABLE_ID] = self.out_ctrl_operand
+		self.operand_handlers[self.CTC2_ITABLE_ID] = self.out_ctrl_operand
+		self.operand_handlers[self.QMFC2_ITABLE_ID] = self.out_vf_operand
+		self.operand_handlers[self.QMTC2_ITABLE_ID] = self.out_vf_operand
+		self.operand_handlers[self.LQC2_ITABLE_ID] = self.out_vf_operand
+		self.operand_handlers[self.SQC2_ITABLE_ID] = self.out_vf_operand
+
+		# Operand number of the VF register in QMFC2/QMTC2/LQC2/SQC2.
+		self.vf_operands = {
+			self.QMFC2_ITABLE_ID: 1,
+			self.QMTC2_ITABLE_ID: 1,
+			self.LQC2_ITABLE_ID: 0,
+			self.SQC2_ITABLE_ID: 0,
+		}
 
-		if (len(regs) == 2):
-			self.set_reg_type(insn.Op1, regs[0])
-			self.set_reg_type(insn.Op2, regs[1])
+		self.mnem_handlers = dict.fromkeys(self.own_itypes, self.out_cop2_mnem)
+		self.mnem_handlers[cop2.NULL_ITYPE] = self.out_special_mnem
+		self.mnem_handlers[self.CFC2_ITABLE_ID] = self.out_interlock_mnem
+		self.mnem_handlers[self.CTC2_ITABLE_ID] = self.out_interlock_mnem
+		self.mnem_handlers[self.QMFC2_ITABLE_ID] = self.out_interlock_mnem
+		self.mnem_handlers[self.QMTC2_ITABLE_ID] = self.out_interlock_mnem
+		self.mnem_handlers[ida_allins.MIPS_sync] = self.out_sync_mnem
 
-		elif (len(regs) == 3):
-			self.set_reg_type(insn.Op1, regs[0])
-			self.set_reg_type(insn.Op2, regs[1])
-			self.set_reg_type(insn.Op3, regs[2])
+	def ev_ana_insn(self, insn):
 
-		insn.size = 4
+		return self.decoder.decode(insn, ida_bytes.get_wide_dword(insn.ea))
 
-	def ev_ana_insn(self, insn):
+	# Opcode name of an instruction decoded by ev_ana_insn.
+	def classify_insn(self, args, result):
 
-		dword = ida_bytes.get_wide_dword(insn.ea)
+		insn = args[0]
+		if (insn.itype in self.own_itypes):
+			return cop2.ITABLE_NAMES[insn.itype - ITYPE_START]
+		elif (insn.Op1.specval == cop2.CACHE):
+			return "cache"
+		return cop2.BC0_NAMES[insn.Op1.specval & 3]
 
-		if (dword >> 0x19 == 0x25):
+	# Wraps the hooks with counters and timers, or restores them. The
+	# hooks are re-registered so IDA picks up the new methods.
+	def set_profiling(self, enable):
 
-			if (dword & 0x3C == 0x3C):
-				opcode = dword & 0x7FF
-			else:
-				opcode = dword & 0x3F
-
-			pos = 0
-			if (opcode & 0xF00 == 0x100):
-				pos = self.pos_0x100
-			elif (opcode & 0xF00 == 0x200):
-				pos = self.pos_0x200
-			elif (opcode & 0xF00 == 0x300):
-				pos = self.pos_0x300
-			elif (opcode & 0xF00 == 0x400):
-				pos = self.pos_0x400
-
-			found = False
-			index = 0
-			for i in range(pos, len(self.itable)):
-				if (self.itable[i].opcode == opcode):
-					found = True
-					index = i
-					break
-
-			if (not found):
-				return 0
-
-			self.decode_instruction(index, insn, dword)
-
-		elif (dword >> 21 == 0x208):
-			self.decode_type_bc0(insn, dword)
-		elif (dword >> 26 == 0x2F):
-			self.decode_type_cache(insn, dword)
-		else:
-			return 0
-		return insn.size
+		if (enable == self.profiling):
+			return
 
-	#def ev_get_autocmt(self, insn):
-	#	if (insn.itype >= ITYPE_START and insn.itype < ITYPE_START + len(self.itable)):
-	#		return self.itable[insn.itype-ITYPE_START].cmt
-	#	return 0
+		self.unhook()
+		if (enable):
+			self.profiler = HookProfiler()
+			for name in PROFILED_HOOKS:
+				classify = self.classify_insn if name == "ev_ana_insn" else None
+				setattr(self, name, self.profiler.wrap(name, getattr(self, name), classify))
+		else:
+			for name in PROFILED_HOOKS:
+				delattr(self, name)
+		self.profiling = enable
+		self.hook()
+
+	def decode_range(self, start_ea, end_ea):
+
+		start_ea = (start_ea + 3) & ~3
+		data = ida_bytes.get_bytes(start_ea, (end_ea - start_ea) & ~3)
+		if (data == None):
+			data = b""
+
+		return self.decoder.decode_buffer(data, start_ea)
+
+	def decode_segment(self, seg):
+
+		return self.decode_range(seg.start_ea, seg.end_ea)
+
+	def find_cache_words(self, data, start_ea):
+
+		try:
+			result = self.decoder.decode_buffer(data, start_ea)
+		except ImportError:
+			return [(ea, dword) for ea, dword in self.decoder.scan_buffer(data, start_ea) if cop2.is_cache(dword)]
+
+		hits = result[result['kind'] == cop2.CACHE]
+		return zip(hits['ea'].tolist(), hits['dword'].tolist())
+
+	# Re-hashes the chunks around start_ea..end_ea and queues the ones whose
+	# COP2/BC0/CACHE words changed for re-analysis. Returns the ranges.
+	def refresh_range(self, start_ea, end_ea, plan = True):
+
+		seg = ida_segment.getseg(start_ea)
+		if (seg == None):
+			return []
+
+		size = self.chunks.chunk_size
+		start_ea = max(seg.start_ea, start_ea - (start_ea % size))
+		end_ea = min(seg.end_ea, end_ea + (-end_ea % size))
+		start_ea = (start_ea + 3) & ~3
+		data = ida_bytes.get_bytes(start_ea, (end_ea - start_ea) & ~3)
+		if (data == None):
+			return []
+
+		changed = self.chunks.update(start_ea, data)
+		self.apply_changes(changed, plan)
+
+		return changed
+
+	# Without plan only the hashes are recorded: seeding the index sees every
+	# chunk as new, which says nothing about the database having changed.
+	def apply_changes(self, changed, plan):
+
+		if (not plan or not changed):
+			return
+
+		self.ngrams = None
+		self.drop_decode_index()
+		for chunk_start, chunk_end in changed:
+			self.defuse.invalidate(chunk_start, chunk_end)
+			# BC0 entries of changed chunks come back on reanalysis.
+			targets = self.decoder.bc0_targets
+			for ea in [ea for ea in targets if ea >= chunk_start and ea < chunk_end]:
+				del targets[ea]
+			ida_auto.plan_range(chunk_start, chunk_end)
+
+	# Job steps re-hashing every segment, see refresh_range().
+	def index_steps(self, plan = True):
+
+		changed = []
+		for start_ea, data, done, total in self.segment_chunks():
+			found = self.chunks.update(start_ea, data)
+			self.apply_changes(found, plan)
+			changed.extend(found)
+			yield (done, total)
+
+		return changed
+
+	def refresh_segments(self, plan = True):
+
+		return run_to_end(self.index_steps(plan))
+
+	# Yields (start_ea, bytes, done, total) over every segment, one
+	# JOB_CHUNK_SIZE aligned block at a time. Blocks are read when the job
+	# gets to them, so each step works on a fresh snapshot.
+	def segment_chunks(self):
+
+		ranges = []
+		seg = ida_segment.get_first_seg()
+		while (seg != None):
+			start_ea = (seg.start_ea + 3) & ~3
+			ranges.append((start_ea, start_ea + ((seg.end_ea - start_ea) & ~3)))
+			seg = ida_segment.get_next_seg(seg.start_ea)
+
+		total = sum(end_ea - start_ea for start_ea, end_ea in ranges)
+		done = 0
+		for start_ea, end_ea in ranges:
+			ea = start_ea
+			while (ea < end_ea):
+				end = min(end_ea, ea + JOB_CHUNK_SIZE - (ea % JOB_CHUNK_SIZE))
+				data = ida_bytes.get_bytes(ea, end - ea)
+				done += end - ea
+				if (data != None):
+					yield (ea, data, done, total)
+				ea = end
+
+	# Queues a job (a generator of (done, total) steps) to run in the
+	# background, replacing a queued job of the same name.
+	def start_job(self, name, steps, done = None):
+
+		self.scheduler.add(Job(name, steps, done))
+		if (self.timer == None):
+			self.timer = ida_kernwin.register_timer(JOB_INTERVAL, self.run_jobs)
+
+	def run_jobs(self):
+
+		# The timer stops on -1, and start_job() registers a new one only
+		# while self.timer is None, so reset it on any way out.
+		interval = -1
+		try:
+			if (self.scheduler.step()):
+				interval = JOB_INTERVAL
+		finally:
+			if (interval < 0):
+				self.timer = None
+		return interval
+
+	def cancel_jobs(self):
+
+		return self.scheduler.cancel()
+
+	def stop_jobs(self):
+
+		self.cancel_jobs()
+		if (self.timer != None):
+			ida_kernwin.unregister_timer(self.timer)
+			self.timer = None
+
+	def report_job(self, job):
+
+		if (job.cancelled):
+			print("COP2 %s: cancelled at %d%%" % (job.name, job.percent()))
+		elif (job.error != None):
+			print("COP2 %s: failed" % job.name)
+			traceback.print_exception(type(job.error), job.error, job.error.__traceback__)
+		elif (job.finished):
+			print("COP2 %s: done" % job.name)
+		else:
+			print("COP2 %s: %d%%" % (job.name, job.percent()))
+
+	def get_index_path(self):
+
+		return os.path.splitext(idc.get_idb_path())[0] + INDEX_EXTENSION
+
+	# Writes the COP2, BC0 and CACHE instructions that are code to the
+	# decode index and keeps it open. Returns the number of records.
+	def save_decode_index(self):
+
+		# The file is replaced, which fails on Windows while it is mapped.
+		self.drop_decode_index()
+
+		is_code = lambda ea: ida_bytes.is_code(ida_bytes.get_flags(ea))
+		blocks = []
+		seg = ida_segment.get_first_seg()
+		while (seg != None):
+			start_ea = (seg.start_ea + 3) & ~3
+			data = ida_bytes.get_bytes(start_ea, (seg.end_ea - start_ea) & ~3)
+			if (data != None):
+				blocks.append(decodeindex.pack_records(self.decoder, data, start_ea, is_code))
+			seg = ida_segment.get_next_seg(seg.start_ea)
+
+		count = decodeindex.write_index(self.get_index_path(), blocks)
+		self.load_decode_index()
+		return count
+
+	# Opens the saved decode index. Only call this while the database is
+	# as it was saved: when opening an analysed database, or after a save.
+	def load_decode_index(self):
+
+		self.drop_decode_index()
+		self.index = decodeindex.load_index(self.get_index_path())
+		return self.index
+
+	def drop_decode_index(self):
+
+		if (self.index != None):
+			self.index.close()
+			self.index = None
+
+	# Lines of a segment, read from the database one block at a time.
+	def export_segment_lines(self, exporter, seg):
+
+		start_ea = (seg.start_ea + 3) & ~3
+		for ea in range(start_ea, seg.end_ea & ~3, export.BLOCK_SIZE):
+			data = ida_bytes.get_bytes(ea, min(export.BLOCK_SIZE, (seg.end_ea & ~3) - ea))
+			if (data == None):
+				continue
+			for line in exporter.lines(data, ea):
+				yield line
+
+	# Writes every code segment as GNU as / ee-gcc assembly to path.
+	# Returns the number of lines.
+	def export_asm(self, path, addresses = True):
+
+		exporter = export.Exporter(self.decoder, addresses)
+		count = 0
+		with open(path, "w", buffering=1 << 20) as f:
+			f.write(export.HEADER)
+			seg = ida_segment.get_first_seg()
+			while (seg != None):
+				if (seg.type == ida_segment.SEG_CODE):
+					f.write("\n\t# %s 0x%08X\n\t.text\n" % (ida_segment.get_segm_name(seg), seg.start_ea))
+					count += export.write_lines(f, self.export_segment_lines(exporter, seg))
+				seg = ida_segment.get_next_seg(seg.start_ea)
+
+		return count
+
+	# Finds runs of likely COP2 code in unexplored bytes and queues them
+	# for code creation in one batch. Returns the queued runs.
+	def scan_unexplored(self):
+
+		runs = []
+		seg = ida_segment.get_first_seg()
+		while (seg != None):
+			start_ea = (seg.start_ea + 3) & ~3
+			data = ida_bytes.get_bytes(start_ea, (seg.end_ea - start_ea) & ~3)
+			if (data != None):
+				for run_start, run_end, hits in scanner.find_code_runs(self.decoder, data, start_ea):
+					# Leave runs that overlap anything already analysed.
+					if (ida_bytes.is_unknown(ida_bytes.get_flags(run_start)) and ida_bytes.next_head(run_start, run_end) >= run_end):
+						runs.append((run_start, run_end, hits))
+			seg = ida_segment.get_next_seg(seg.start_ea)
+
+		for run_start, run_end, hits in runs:
+			ida_auto.auto_make_code(run_start)
+
+		return runs
+
+	# (ea, itable index, dword) of the COP2 macro words in seg.
+	def find_cop2_words(self, seg):
+
+		try:
+			result = self.decode_segment(seg)
+		except ImportError:
+			start_ea = (seg.start_ea + 3) & ~3
+			data = ida_bytes.get_bytes(start_ea, (seg.end_ea - start_ea) & ~3)
+			if (data == None):
+				return []
+			return [(ea, self.decoder.lookup(dword)[0], dword) for ea, dword in self.decoder.scan_buffer(data, start_ea) if cop2.is_cop2(dword)]
+
+		hits = result[result['kind'] == 0]
+		return zip(hits['ea'].tolist(), hits['index'].tolist(), hits['dword'].tolist())
+
+	def get_ngram_index(self):
+
+		if (self.ngrams == None):
+			if (self.index != None):
+				records = [(ea, index, dword) for ea, kind, index, dword in self.index if kind == 0]
+			else:
+				records = []
+				seg = ida_segment.get_first_seg()
+				while (seg != None):
+					for ea, index, dword in self.find_cop2_words(seg):
+						if (ida_bytes.is_code(ida_bytes.get_flags(ea))):
+							records.append((ea, index, dword))
+					seg = ida_segment.get_next_seg(seg.start_ea)
+			self.ngrams = NgramIndex(self.decoder, records)
+
+		return self.ngrams
+
+	# Job steps collecting the COP2 usage over the code of every segment.
+	def stats_steps(self):
+
+		stats = COP2Stats()
+		is_code = lambda ea: ida_bytes.is_code(ida_bytes.get_flags(ea))
+		for start_ea, data, done, total in self.segment_chunks():
+			stats.words += len(data) // 4
+			stats.add_buffer(self.decoder, data, start_ea, is_code)
+			yield (done, total)
+
+		return stats
+
+	def collect_stats(self):
+
+		return run_to_end(self.stats_steps())
+
+	# Comment every CACHE instruction with its operation, leaving existing
+	# comments alone. Returns the number of comments written.
+	def annotate_cache_comments(self):
+
+		return run_to_end(self.annotate_cache_steps())
+
+	# Job steps for annotate_cache_comments(), writing the comments of one
+	# block per step.
+	def annotate_cache_steps(self):
+
+		count = 0
+		for start_ea, data, done, total in self.segment_chunks():
+			for ea, dword in self.find_cache_words(data, start_ea):
+				if (ida_bytes.is_code(ida_bytes.get_flags(ea)) and idc.get_cmt(ea, 0) == None):
+					idc.set_cmt(ea, cop2.CACHE_COMMENTS[(dword >> 16) & 0x1F], 0)
+					count += 1
+			yield (done, total)
+
+		return count
+
+	def set_stall_cmt(self, ea, text):
+
+		cmt = idc.get_cmt(ea, 0)
+		if ((cmt == None and text) or (cmt != None and cmt.startswith(STALL_CMT_PREFIX))):
+			idc.set_cmt(ea, text, 0)
+
+	# Estimates COP2 stalls in the function at ea. Instructions that stall
+	# and loop heads get a comment. Returns [(loop head, stalls, cycles)].
+	def estimate_function_stalls(self, ea):
+
+		func = ida_funcs.get_func(ea)
+		if (func == None):
+			return []
+
+		blocks = sorted(ida_gdl.FlowChart(func), key=lambda block: block.start_ea)
+		words = {}
+		for block in blocks:
+			words[block.start_ea] = [(ea, ida_bytes.get_wide_dword(ea)) for ea in range(block.start_ea, block.end_ea, 4)]
+
+		stalls = {}
+		for block in blocks:
+			stalls.update(self.stalls.estimate_block(words[block.start_ea])[0])
+
+		# A back edge closes a loop; its body is taken as the blocks between
+		# the head and the latch, in address order.
+		loops = []
+		for block in blocks:
+			for succ in block.succs():
+				if (succ.start_ea > block.start_ea):
+					continue
+				body = []
+				for other in blocks:
+					if (other.start_ea >= succ.start_ea and other.start_ea <= block.start_ea):
+						body.extend(words[other.start_ea])
+				loop_stalls, cycles = self.stalls.estimate_loop(body)
+				stalls.update(loop_stalls)
+				total = sum(stall for ea, stall in loop_stalls)
+				loops.append((succ.start_ea, total, cycles))
+
+		cmts = {}
+		for ea, stall in stalls.items():
+			if (stall):
+				cmts[ea] = "%s: %d" % (STALL_CMT_PREFIX, stall)
+		for head, total, cycles in loops:
+			cmts[head] = "%s: %d, loop %d stall cycles, %d cycles/iteration" % (STALL_CMT_PREFIX, stalls.get(head, 0), total, cycles)
+
+		# Drop stale comments from an earlier run.
+		for ea in stalls:
+			self.set_stall_cmt(ea, cmts.get(ea, ""))
+
+		return loops
+
+	# Def-use index of the function containing ea, or None.
+	def get_defuse(self, ea):
+
+		func = ida_funcs.get_func(ea)
+		if (func == None):
+			return None
+
+		index = self.defuse.lookup(func.start_ea, func.end_ea)
+		if (index != None):
+			return index
+
+		data = ida_bytes.get_bytes(func.start_ea, func.end_ea - func.start_ea)
+		if (data == None):
+			return None
+
+		return self.defuse.build(func.start_ea, data)
+
+	# (kind, register, ea) rows for the instruction at ea: where the
+	# registers it reads were defined and where the ones it writes are
+	# used. Fields of one register with the same target are merged.
+	def get_defuse_rows(self, ea):
+
+		index = self.get_defuse(ea)
+		if (index == None):
+			return []
+
+		targets = []
+		for res, def_ea in index.reaching.get(ea, {}).items():
+			targets.append(("def", res, def_ea))
+		for res, uses in index.def_uses.get(ea, {}).items():
+			for use_ea in uses:
+				targets.append(("use", res, use_ea))
+
+		rows = {}
+		for kind, res, target in sorted(targets):
+			reg, dot, field = defuse.resource_name(res).partition(".")
+			key = (kind, reg, target)
+			rows[key] = rows.get(key, reg + dot) + field
+
+		return [(kind, name, target) for (kind, reg, target), name in rows.items()]
+
+	def ev_get_autocmt(self, insn):
+
+		if (self.autocmt):
+			return self.autocmts[insn.itype]
+		return None
+
+	# VIF MPG packets in the database, scanned on first use.
+	def get_mpg_packets(self):
+
+		if (self.mpg_packets == None):
+			self.mpg_packets = []
+			seg = ida_segment.get_first_seg()
+			while (seg != None):
+				data = ida_bytes.get_bytes(seg.start_ea, seg.end_ea - seg.start_ea)
+				if (data != None):
+					self.mpg_packets.extend(vu0micro.find_mpg_packets(data, seg.start_ea))
+				seg = ida_segment.get_next_seg(seg.start_ea)
+
+		return self.mpg_packets
+
+	# Listing of every uploaded microprogram that covers a VU0 address.
+	def get_vu0_listing(self, vu_addr):
+
+		lines = []
+		for ea, base, blob in self.get_mpg_packets():
+			if (vu_addr >= base and vu_addr < base + len(blob)):
+				lines.append("; MPG at 0x%X, VU0 0x%X-0x%X" % (ea, base, base + len(blob)))
+				lines.extend(self.micro.format_program(self.micro.decode_program(blob, vu_addr, base)))
+				lines.append("")
+
+		return lines
 
 	def ev_emu_insn(self, insn):
 		
 		# Required for every single COP2 instruction.
-		if (insn.itype >= ITYPE_START and insn.itype < ITYPE_START + len(self.itable)):
+		if (insn.itype in self.own_itypes):
 			insn.add_cref(insn.ea + 4, insn.ea, 21); # 21 Ordinary flow
 			return 1
 		
-		# Fix BC0 flow.
-		elif (insn.Op1.specval & 0xF00 == 0x100):
-			insn.add_cref(insn.ea + 4, insn.ea, 21);
-			insn.add_cref(insn.Op1.addr, insn.ea, 19);
-			#ida_idp.delay_slot_insn(insn.ea+4, 1, 1)
+		# Fix BC0 flow. The delay slot always follows the branch; for the
+		# likely forms it is nullified when the branch is not taken, so the
+		# instruction after it is reached straight from the branch.
+		elif (insn.itype == cop2.NULL_ITYPE and insn.Op1.specval & 0xF00 == 0x100):
+			insn.add_cref(insn.ea + 4, insn.ea, 21); # 21 Ordinary flow
+			insn.add_cref(insn.Op1.addr, insn.ea, 19); # 19 Jump near
+			if (insn.Op1.specval & 2):
+				insn.add_cref(insn.ea + 8, insn.ea, 19);
 			return 1
 
+		# Comment CACHE instructions as they become code, so code created
+		# after the batch pass is covered too. Flow is left to the MIPS module.
+		elif (insn.itype == cop2.NULL_ITYPE and insn.Op1.specval == cop2.CACHE):
+			if (idc.get_cmt(insn.ea, 0) == None):
+				idc.set_cmt(insn.ea, self.decoder.get_cache_comment(insn.Op1), 0)
+
 		return 0
 
-	def decode_reg_field(self, val):
+	# A BC0 block ends after its delay slot, not at the branch.
+	def ev_is_basic_block_end(self, insn, call_insn_stops_block):
 
-		return ["x", "y", "z", "w"][val]
+		if (insn.ea in self.decoder.bc0_targets):
+			return -1
+		elif (insn.ea - 4 in self.decoder.bc0_targets):
+			return 1
 
-	def get_bc0_type(self, bc0_type):
-	
-		bc0_type -= 0x100
-		if bc0_type == 0:
-			return "bc0f"
-		elif bc0_type == 1:
-			return "bc0t"
-		elif bc0_type == 2:
-			return "bc0fl"
-		else:
-			return "bc0tl"
-
-	def get_register(self, op, ctx):
-
-		if (op.specval == self.VF_REG):
-			return "vf%d" % op.reg
-		elif (op.specval == self.VI_REG):
-			if op.reg < 16:
-				return "vi%d" % op.reg
-			elif op.reg == 16:
-				return "STATUS"
-			elif op.reg == 17:
-				return "MAC"
-			elif op.reg == 18:
-				return "CLIP"
-			elif op.reg == 20:
-				return "R"
-			elif op.reg == 21:
-				return "I"
-			elif op.reg == 22:
-				return "Q"
-			elif op.reg == 26:
-				return "TPC"
-			elif op.reg == 27:
-				return "CMSAR0"
-			elif op.reg == 28:
-				return "FBRST"
-			elif op.reg == 29:
-				return "VPU-STAT"
-			elif op.reg == 31:
-				return "CMSAR1"
-			else:
-				return "UNK VI"
-		elif (op.specval == self.VI_REG_INC):
-			return "(vi%d++)" % op.reg
-		elif (op.specval == self.VI_REG_DEC):
-			return "(--vi%d)" % op.reg
-		elif (op.specval == self.VF_REG_WITH_F):
-			return "vf%d.%s" % (op.reg & 0xFF, self.decode_reg_field(op.reg >> 8))
-		elif (op.specval == self.VF_REG_WITH_F2):
-			return "vf%d%s" % (op.reg & 0xFF, self.decode_reg_field((ida_bytes.get_wide_dword(ctx.insn.ea)) & 3))
-		elif (op.specval == self.CTL_REG):
-			return "%c" % op.reg
-		elif (op.specval == self.CTL_ACC):
-			return "ACC"
-		else:
-			return "UNK"
-
-	def get_cache_function(self, op):
-		if   (op.value == 0x00): return "ixltg"
-		elif (op.value == 0x01): return "ixldt"
-		elif (op.value == 0x02): return "bxlbt"
-		elif (op.value == 0x04): return "ixstg"
-		elif (op.value == 0x05): return "ixsdt"
-		elif (op.value == 0x06): return "bxsbt"
-		elif (op.value == 0x07): return "ixin"
-		elif (op.value == 0x0A): return "bhinbt"
-		elif (op.value == 0x0B): return "ihin"
-		elif (op.value == 0x0C): return "bfh"
-		elif (op.value == 0x0E): return "ifl"
-		elif (op.value == 0x10): return "dxltg"
-		elif (op.value == 0x11): return "dxldt"
-		elif (op.value == 0x12): return "dxstg"
-		elif (op.value == 0x13): return "dxsdt"
-		elif (op.value == 0x14): return "dxwbin"
-		elif (op.value == 0x16): return "dxin"
-		elif (op.value == 0x18): return "dhwbin"
-		elif (op.value == 0x1A): return "dhin"
-		elif (op.value == 0x1C): return "dhwoin"
-		else: return "UNKNOWN"
+		return 0
 
-	def ev_out_operand(self, ctx, op):
+	def out_cop2_operand(self, ctx, op):
 
-		if (op.specval == self.VCALLMS):
+		if (op.specval == cop2.VCALLMS):
 			ctx.out_line("0x%X " % (op.value), 31)
 			ctx.out_line("# VU0 address: 0x%X" % (op.value << 3), 4)
 			return 1
 
-		elif (op.specval == self.CACHE):
-			ctx.out_register(self.get_cache_function(op))
+		elif (op.type == ida_ua.o_idpspec1):
+			ctx.out_register(self.decoder.render(op.addr)[2][op.n])
 			return 1
 
-		elif (op.type == ida_ua.o_idpspec1):
+		return 0
 
-			# First we need to fix instructions (badly) disassembled by mips.dll
-			if (ctx.insn.itype == self.CFC2_ITABLE_ID and op.n == 1):
-				op.specval = self.VI_REG
-				ctx.out_register(self.get_register(op, ctx))
-			elif (ctx.insn.itype == self.CTC2_ITABLE_ID and op.n == 1):
-				op.specval = self.VI_REG
-				ctx.out_register(self.get_register(op, ctx))
-			elif (ctx.insn.itype == self.QMFC2_ITABLE_ID and op.n == 1):
-				ctx.out_register("vf%d" % op.reg)
-			elif (ctx.insn.itype == self.QMTC2_ITABLE_ID and op.n == 1):
-				ctx.out_register("vf%d" % op.reg)
-			elif (ctx.insn.itype == self.LQC2_ITABLE_ID and op.n == 0):
-				ctx.out_register("vf%d" % op.reg)
-			elif (ctx.insn.itype == self.SQC2_ITABLE_ID and op.n == 0):
-				ctx.out_register("vf%d" % op.reg)
-			elif (ctx.insn.itype >= ITYPE_START and ctx.insn.itype < ITYPE_START + len(self.itable)):
-				ctx.out_register(self.get_register(op, ctx))
-			else:
-				return 0
+	def out_special_operand(self, ctx, op):
+
+		if (op.specval == cop2.CACHE):
+			ctx.out_register(self.decoder.get_cache_function(op))
 			return 1
 
 		return 0
 
-	def decode_dest(self, dword):
+	# First we need to fix instructions (badly) disassembled by mips.dll
+	def out_ctrl_operand(self, ctx, op):
+
+		if (op.type == ida_ua.o_idpspec1 and op.n == 1):
+			op.specval = cop2.VI_REG
+			ctx.out_register(self.decoder.get_register(op))
+			return 1
 
-		dest = (dword >> 0x15) & 0xF 
+		return 0
 
-		s = "."
-		if ((dest >> 3) & 1):
-			s += "x"
-		if ((dest >> 2) & 1):
-			s += "y"
-		if ((dest >> 1) & 1):
-			s += "z"
-		if (dest & 1):
-			s += "w"
+	def out_vf_operand(self, ctx, op):
 
-		return s
-		
-	def get_cache_comment(self, op):
-		if   (op.value == 0x00): return "Read tag from specified icache entry to TagLo"
-		elif (op.value == 0x01): return "Read data from specified icache entry to TagLo, and steering bits and BHT to TagHi"
-		elif (op.value == 0x02): return "Read BTACache entry. FetchAddr to TagLo TargetAddr to TagHi"
-		elif (op.value == 0x04): return "Write tag from TagLo to specified icache entry"
-		elif (op.value == 0x05): return "Write instruction from TagLo to specified icache entry, also write steering bits from TagHi"
-		elif (op.value == 0x06): return "Write TagLo to FetchAddr and TagHi to TargetAddr of BTACache entry"
-		elif (op.value == 0x07): return "Invalidate specified icache index entry"
-		elif (op.value == 0x0A): return "Partially invalidate BTACache"
-		elif (op.value == 0x0B): return "Invalidate specified icache entry"
-		elif (op.value == 0x0C): return "Invalidates all BTACache entries"
-		elif (op.value == 0x0E): return "Read data from memory into specified icache entry"
-		elif (op.value == 0x10): return "Read specified dcache tag entry to TagLo"
-		elif (op.value == 0x11): return "Read data from specified dcache entry to TagLo"
-		elif (op.value == 0x12): return "Write tag from TagLo to specified dcache entry"
-		elif (op.value == 0x13): return "Write data from TagLo to specified dcache entry"
-		elif (op.value == 0x14): return "Write specified dcache entry back to memory and invalidate index"
-		elif (op.value == 0x16): return "Invalidate specified dcache index entry"
-		elif (op.value == 0x18): return "Write specified dcache entry back to memory and invalidate it"
-		elif (op.value == 0x1A): return "Invalidate specified dcache entry"
-		elif (op.value == 0x1C): return "Write dcache entry back to memory, don't invalidate"
-		else: return "UNKNOWN"
+		if (op.type == ida_ua.o_idpspec1 and op.n == self.vf_operands[ctx.insn.itype]):
+			ctx.out_register("vf%d" % op.reg)
+			return 1
 
-	def ev_out_mnem(self, ctx):
-		
-		# Fix interlock for CTX2/QMTX2.
-		if (ctx.insn.itype in [self.CFC2_ITABLE_ID, self.CTC2_ITABLE_ID, self.QMFC2_ITABLE_ID, self.QMTC2_ITABLE_ID]):
-			if (ctx.insn.Op3.value == 1):
-				ctx.insn.Op3.clr_shown()
-				ctx.out_mnem(MNEM_WIDTH, ".i")
-				return 1		
-
-		# Fix SYNC stype.		
-		if (ctx.insn.itype == ida_allins.MIPS_sync):
-			if (ctx.insn.Op1.value & 0x10 == 0x10):
-				ctx.out_mnem(MNEM_WIDTH, ".p")
-			else:
-				ctx.out_mnem(MNEM_WIDTH, "")
-			ctx.insn.Op1.clr_shown()
+		return 0
+
+	def ev_out_operand(self, ctx, op):
+
+		handler = self.operand_handlers.get(ctx.insn.itype)
+		if (handler == None):
+			return 0
+
+		return handler(ctx, op)
+
+	# Fix interlock for CTX2/QMTX2.
+	def out_interlock_mnem(self, ctx):
+
+		if (ctx.insn.Op3.value == 1):
+			ctx.insn.Op3.clr_shown()
+			ctx.out_mnem(MNEM_WIDTH, ".i")
 			return 1
 
+		return 0
+
+	# Fix SYNC stype.
+	def out_sync_mnem(self, ctx):
+
+		if (ctx.insn.Op1.value & 0x10 == 0x10):
+			ctx.out_mnem(MNEM_WIDTH, ".p")
+		else:
+			ctx.out_mnem(MNEM_WIDTH, "")
+		ctx.insn.Op1.clr_shown()
+		return 1
+
+	def out_special_mnem(self, ctx):
+
+		specval = ctx.insn.Op1.specval
+
 		# Fix BC0 opcodes.
-		elif (ctx.insn.Op1.specval & 0xF00 == 0x100):
-			ctx.out_custom_mnem(self.get_bc0_type(ctx.insn.Op1.specval), MNEM_WIDTH, "")
+		if (specval & 0xF00 == 0x100):
+			ctx.out_custom_mnem(self.decoder.get_bc0_type(specval), MNEM_WIDTH, "")
 			return 1
 
 		# Fix CACHE opcodes.
-		elif (ctx.insn.Op1.specval == self.CACHE):
-			#ctx.out_custom_mnem("cache." + self.get_cache_function(ctx.insn.Op1), MNEM_WIDTH, "")
+		elif (specval == cop2.CACHE):
+			#ctx.out_custom_mnem("cache." + self.decoder.get_cache_function(ctx.insn.Op1), MNEM_WIDTH, "")
 			ctx.out_custom_mnem("cache", MNEM_WIDTH, "")
-			if idc.get_cmt(ctx.insn.ea, 0) == None:
-				idc.set_cmt(ctx.insn.ea, self.get_cache_comment(ctx.insn.Op1), 0)
 			return 1
 
-		# Fix COP2 opcodes.
-		elif (ctx.insn.itype >= ITYPE_START and ctx.insn.itype < ITYPE_START + len(self.itable)):
-			dest = ""
-			if (self.itable[ctx.insn.itype - ITYPE_START].dest):
-				dest = self.decode_dest(ida_bytes.get_wide_dword(ctx.insn.ea))
-			ctx.out_custom_mnem(self.itable[ctx.insn.itype - ITYPE_START].name, MNEM_WIDTH, dest)
+		return 0
+
+	# Fix COP2 opcodes.
+	def out_cop2_mnem(self, ctx):
+
+		name, dest, operands = self.decoder.render(ctx.insn.Op1.addr)
+		ctx.out_custom_mnem(name, MNEM_WIDTH, dest)
+		return 1
+
+	def ev_out_mnem(self, ctx):
+
+		handler = self.mnem_handlers.get(ctx.insn.itype)
+		if (handler != None and handler(ctx)):
 			return 1
 
 		# We do this to fix width of other instructions
 		ctx.out_mnem(MNEM_WIDTH)
 		return 1
 
+class VU0_viewer(ida_kernwin.simplecustviewer_t):
+
+	def show(self, title, lines):
+
+		if (not self.Create(title)):
+			return False
+		for line in lines:
+			self.AddLine(line)
+		return self.Show()
+
+class DefUse_chooser(ida_kernwin.Choose):
+
+	def __init__(self, title, rows):
+		ida_kernwin.Choose.__init__(self, title, [
+			["Kind", 4 | ida_kernwin.Choose.CHCOL_PLAIN],
+			["Register", 10 | ida_kernwin.Choose.CHCOL_PLAIN],
+			["Address", 10 | ida_kernwin.Choose.CHCOL_HEX],
+			["Instruction", 40 | ida_kernwin.Choose.CHCOL_PLAIN],
+		])
+		self.rows = rows
+
+	def OnGetSize(self):
+		return len(self.rows)
+
+	def OnGetLine(self, n):
+		kind, name, ea = self.rows[n]
+		return [kind, name, "%08X" % ea, idc.generate_disasm_line(ea, 0) or ""]
+
+	def OnSelectLine(self, n):
+		ida_kernwin.jumpto(self.rows[n][2])
+		return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+class Pattern_chooser(ida_kernwin.Choose):
+
+	def __init__(self, title, matches):
+		ida_kernwin.Choose.__init__(self, title, [
+			["Address", 10 | ida_kernwin.Choose.CHCOL_HEX],
+			["Instructions", 60 | ida_kernwin.Choose.CHCOL_PLAIN],
+		])
+		self.matches = matches
+
+	def OnGetSize(self):
+		return len(self.matches)
+
+	def OnGetLine(self, n):
+		eas = self.matches[n]
+		return ["%08X" % eas[0], "; ".join(idc.generate_disasm_line(ea, 0) or "" for ea in eas)]
+
+	def OnSelectLine(self, n):
+		ida_kernwin.jumpto(self.matches[n][0])
+		return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+class Stats_chooser(ida_kernwin.Choose):
+
+	def __init__(self, title, rows):
+		ida_kernwin.Choose.__init__(self, title, [
+			["Section", 14 | ida_kernwin.Choose.CHCOL_PLAIN],
+			["Key", 16 | ida_kernwin.Choose.CHCOL_PLAIN],
+			["Value", 10 | ida_kernwin.Choose.CHCOL_PLAIN],
+		])
+		self.rows = rows
+
+	def OnGetSize(self):
+		return len(self.rows)
+
+	def OnGetLine(self, n):
+		return [str(value) for value in self.rows[n]]
+
+	# BC0 rows jump to the branch.
+	def OnSelectLine(self, n):
+		section, key, value = self.rows[n]
+		if (section == "bc0_target"):
+			ida_kernwin.jumpto(int(key, 16))
+		return (ida_kernwin.Choose.NOTHING_CHANGED, )
+
+# Runs the annotation passes once auto-analysis has finished and keeps
+# the chunk index and def-use cache current on patches, segment loads and
+# function changes.
+class COP2_annotate(ida_idp.IDB_Hooks):
+
+	def __init__(self, cop2):
+		ida_idp.IDB_Hooks.__init__(self)
+		self.cop2 = cop2
+
+	def auto_empty_finally(self):
+		self.cop2.start_job("cache comments", self.cop2.annotate_cache_steps())
+
+		self.seed_index()
+
+	# Seed the chunk index once the initial analysis is done. Chunks
+	# patched before the job reaches them are hashed early, which only
+	# queues their reanalysis.
+	def seed_index(self):
+		if (not self.cop2.indexed):
+			self.cop2.start_job("chunk index", self.cop2.index_steps(False))
+			self.cop2.indexed = True
+
+	def byte_patched(self, ea, old_value):
+		# EE side LQC2/QMTC2 words are not in the chunk index.
+		self.cop2.defuse.invalidate(ea, ea + 1)
+		if (self.cop2.indexed):
+			self.cop2.refresh_range(ea, ea + 1)
+
+	def segm_added(self, seg):
+		if (self.cop2.indexed):
+			self.cop2.refresh_range(seg.start_ea, seg.end_ea)
+
+	def savebase(self):
+		self.cop2.save_decode_index()
+
+	def func_updated(self, pfn):
+		self.cop2.defuse.invalidate(pfn.start_ea, pfn.end_ea)
+
+	def deleting_func(self, pfn):
+		self.cop2.defuse.invalidate(pfn.start_ea, pfn.end_ea)
+
+	# Code created or undefined after the save makes the decode index
+	# stale, and the pattern index built from it.
+	def make_code(self, insn):
+		self.drop_decode_index()
+
+	def make_data(self, ea, flags, tid, size):
+		self.drop_decode_index()
+
+	def destroyed_items(self, ea1, ea2, will_disable_range):
+		self.drop_decode_index()
+
+	def drop_decode_index(self):
+		if (self.cop2.index != None):
+			self.cop2.drop_decode_index()
+			self.cop2.ngrams = None
+
 class emotionengine_plugin_t(idaapi.plugin_t):
 	flags = idaapi.PLUGIN_HIDE
 	comment = ""
@@ -729,22 +879,137 @@ class emotionengine_plugin_t(idaapi.plugin_t):
 
 	def __init__(self):
 		self.cop2 = None
+		self.annotate = None
 
 	def init(self):
 		
 		if (idaapi.ph.id == idaapi.PLFM_MIPS and ida_ida.inf_get_procname() == 'r5900l'):
 			self.cop2 = COP2_disassemble()
 			self.cop2.hook()
+			self.annotate = COP2_annotate(self.cop2)
+			self.annotate.hook()
+			# auto_empty_finally is not sent again for an analysed database.
+			if (ida_auto.auto_is_ok()):
+				self.annotate.seed_index()
+				self.cop2.load_decode_index()
 			print("PS2 Emotion Engine COP2 instructions disassembler is loaded")
 			return idaapi.PLUGIN_KEEP
 
 		return idaapi.PLUGIN_SKIP
 
 	def run(self, arg):
-		pass
+
+		if (self.cop2 == None):
+			return
+
+		if (arg == RUN_TOGGLE_AUTOCMT):
+			self.cop2.autocmt = not self.cop2.autocmt
+			print("COP2 auto comments are %s" % ("on" if self.cop2.autocmt else "off"))
+			idaapi.refresh_idaview_anyway()
+
+		elif (arg == RUN_SHOW_VU0_PROGRAM):
+			self.show_vu0_program(idc.get_screen_ea())
+
+		# After loading an overlay from a script, which sends no events.
+		elif (arg == RUN_REFRESH_CHANGED):
+			self.cop2.defuse.clear()
+			changed = self.cop2.refresh_segments()
+			print("COP2: %d changed ranges queued for reanalysis" % len(changed))
+
+		elif (arg == RUN_ESTIMATE_STALLS):
+			for head, total, cycles in self.cop2.estimate_function_stalls(idc.get_screen_ea()):
+				print("0x%X: loop %d stall cycles, %d cycles/iteration" % (head, total, cycles))
+
+		elif (arg == RUN_SHOW_DEFUSE):
+			ea = idc.get_screen_ea()
+			rows = self.cop2.get_defuse_rows(ea)
+			if (not rows):
+				print("0x%X: no VU0 register definitions or uses" % ea)
+				return
+			DefUse_chooser("VU0 def-use at 0x%X" % ea, rows).Show()
+
+		elif (arg == RUN_TOGGLE_PROFILING):
+			self.cop2.set_profiling(not self.cop2.profiling)
+			print("COP2 hook profiling is %s" % ("on" if self.cop2.profiling else "off"))
+
+		elif (arg == RUN_PROFILE_REPORT):
+			if (self.cop2.profiler == None):
+				print("COP2 hook profiling has not been enabled")
+				return
+			print("\n".join(self.cop2.profiler.report()))
+			path = os.path.splitext(idc.get_idb_path())[0] + ".cop2prof.csv"
+			self.cop2.profiler.write_csv(path)
+			print("COP2 hook profile written to %s" % path)
+
+		elif (arg == RUN_EXPORT_ASM):
+			path = os.path.splitext(idc.get_idb_path())[0] + ".s"
+			count = self.cop2.export_asm(path)
+			print("COP2: %d lines written to %s" % (count, path))
+
+		elif (arg == RUN_SCAN_UNEXPLORED):
+			try:
+				runs = self.cop2.scan_unexplored()
+			except ImportError:
+				print("COP2: scanning unexplored bytes needs NumPy")
+				return
+			for run_start, run_end, hits in runs:
+				print("0x%X-0x%X: %d COP2 words" % (run_start, run_end, hits))
+			print("COP2: %d runs queued as code" % len(runs))
+
+		elif (arg == RUN_FIND_PATTERN):
+			pattern = ida_kernwin.ask_str(self.cop2.last_pattern, 0, "VU0 pattern (e.g. vmulax.xyzw ACC, *, $v; vmadday ACC, *, $v; vmaddaz; vmaddw)")
+			if (not pattern):
+				return
+			self.cop2.last_pattern = pattern
+			try:
+				matches = self.cop2.get_ngram_index().query(pattern)
+			except ValueError as e:
+				print("COP2: %s" % e)
+				return
+			print("COP2: %d matches for %s" % (len(matches), pattern))
+			if (matches):
+				Pattern_chooser("VU0 pattern: %s" % pattern, matches).Show()
+
+		elif (arg == RUN_DB_STATS):
+			self.cop2.start_job("stats", self.cop2.stats_steps(), self.show_stats)
+
+		elif (arg == RUN_CANCEL_JOBS):
+			if (not self.cop2.cancel_jobs()):
+				print("COP2: no background jobs")
+
+	def show_stats(self, job):
+
+		stats = job.result
+		path = os.path.splitext(idc.get_idb_path())[0] + ".cop2stats.csv"
+		stats.write_csv(path)
+		print("COP2: %d COP2, %d BC0, %d CACHE instructions, stats written to %s" % (sum(stats.histogram.values()),
+			sum(stats.bc0.values()), sum(stats.cache_ops.values()), path))
+		Stats_chooser("COP2 stats", stats.rows()).Show()
+
+	# Shows the microprogram started by the VCALLMS at ea.
+	def show_vu0_program(self, ea):
+
+		insn = ida_ua.insn_t()
+		if (ida_ua.decode_insn(insn, ea) == 0 or insn.Op1.specval != cop2.VCALLMS):
+			print("0x%X: not a VCALLMS instruction" % ea)
+			return
+
+		vu_addr = insn.Op1.value << 3
+		lines = self.cop2.get_vu0_listing(vu_addr)
+		if (not lines):
+			print("0x%X: no MPG packet uploads VU0 address 0x%X" % (ea, vu_addr))
+			return
+
+		VU0_viewer().show("VU0 0x%X" % vu_addr, lines)
 
 	def term(self):
+		if (self.annotate != None):
+			self.annotate.unhook()
+			self.annotate = None
 		if (self.cop2 != None):
+			self.cop2.stop_jobs()
+			self.cop2.drop_decode_index()
+			self.cop2.set_profiling(False)
 			self.cop2.unhook()
 			self.cop2 = None
 